@@ -0,0 +1 @@
+"""Python services behind the Neurasync Streamlit app and emotion API"""
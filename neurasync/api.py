@@ -0,0 +1,436 @@
+"""
+Flask application exposing emotion detection to the React frontend.
+
+Served standalone by neurasync.serve, or embedded in the Streamlit app
+for local development.
+"""
+
+import hmac
+import json
+import os
+import threading
+import time
+
+from flask import Flask, Response, abort, g, request, jsonify, stream_with_context
+from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
+
+try:
+    from flask_sock import Sock
+except ImportError:  # streaming endpoint is optional
+    Sock = None
+
+from neurasync.emotion import (detect_emotions_batch, detect_faces, get_backend, get_batcher, get_engine,
+                               get_result_cache)
+from neurasync.cache import LRUCache
+from neurasync import gemini
+from neurasync.gemini import ManassuChat, configure_from_env, format_chat_history
+from neurasync.hybrid import MODES as HYBRID_MODES, analyze_hybrid, get_analyzer
+from neurasync import metrics
+from neurasync.profiler import PROFILE_AT_START, get_profiler
+from neurasync.results import validate_result
+from neurasync.sessions import is_session_id, new_session_id
+from neurasync.store import get_store
+
+# Largest request body accepted, in bytes
+MAX_CONTENT_LENGTH = int(os.environ.get('NEURASYNC_MAX_CONTENT_LENGTH', str(16 * 1024 * 1024)))
+
+# Token required to inspect or toggle the sampling profiler over HTTP; unset disables it
+PROFILER_TOKEN = os.environ.get('NEURASYNC_PROFILER_TOKEN')
+
+# Create a Flask app for API endpoints
+app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+CORS(app)  # Allow cross-origin requests
+
+gemini_configured = configure_from_env()
+
+# Persistent chats keyed by their server-issued sessionId
+chat_sessions = LRUCache(max_entries=int(os.environ.get('NEURASYNC_CHAT_SESSIONS', '1000')),
+                         ttl_seconds=float(os.environ.get('NEURASYNC_CHAT_SESSION_TTL', '3600')))
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_latency(response):
+    # Streamed responses are timed until their headers are sent
+    start = g.get('request_start')
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.request_seconds.observe(endpoint, time.perf_counter() - start)
+    return response
+
+
+@app.before_request
+def reject_oversized_body():
+    # Werkzeug only enforces MAX_CONTENT_LENGTH when a route reads the body
+    if request.content_length is not None and request.content_length > MAX_CONTENT_LENGTH:
+        abort(413)
+
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f'Request body exceeds {MAX_CONTENT_LENGTH} bytes'}), 413
+
+
+def _is_binary(mimetype):
+    return mimetype == 'application/octet-stream' or mimetype.startswith('image/')
+
+
+def _request_image():
+    """Return the image from a multipart, raw binary or base64 JSON body, or None"""
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('image')
+        return upload.read() if upload else None
+    if _is_binary(request.mimetype):
+        return request.get_data(cache=False) or None
+    data = request.get_json(silent=True)
+    if not data or 'image' not in data:
+        return None
+    return data['image']
+
+
+def _request_images():
+    """Return the image list from a multipart or base64 JSON body, or None"""
+    if request.mimetype == 'multipart/form-data':
+        uploads = request.files.getlist('images')
+        return [upload.read() for upload in uploads] if uploads else None
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('images'), list):
+        return None
+    return data['images']
+
+
+@app.route('/api/detect_emotion', methods=['POST'])
+def api_detect_emotion():
+    """
+    API endpoint for emotion detection accessible to the React frontend
+
+    Accepts JSON {"image": base64}, multipart/form-data with an "image" file,
+    or the raw encoded image as application/octet-stream or image/*.
+    ?mode=local|fallback|race overrides NEURASYNC_HYBRID_MODE.
+    """
+    try:
+        image = _request_image()
+        if image is None:
+            return jsonify({'error': 'No image data provided'}), 400
+
+        mode = request.args.get('mode')
+        if mode is not None and mode not in HYBRID_MODES:
+            return jsonify({'error': f'Unknown mode: {mode}'}), 400
+
+        # Local-first with Gemini fallback; concurrent local calls are
+        # coalesced into one batched model call
+        result = analyze_hybrid(image, mode, batched=True)
+        return jsonify(result)
+    except HTTPException:
+        raise  # e.g. 413 from MAX_CONTENT_LENGTH, answered by its error handler
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/detect_emotion/batch', methods=['POST'])
+def api_detect_emotion_batch():
+    """
+    Batch endpoint returning {"results": [...]} in input order
+
+    Accepts JSON {"images": [base64, ...]} or multipart/form-data with
+    repeated "images" files.
+    """
+    try:
+        images = _request_images()
+        if images is None:
+            return jsonify({'error': 'No image list provided'}), 400
+
+        results = detect_emotions_batch(images)
+        return jsonify({'results': results})
+    except HTTPException:
+        raise
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/detect_emotion/faces', methods=['POST'])
+def api_detect_faces():
+    """
+    Multi-face endpoint: one result per detected face, with bounding boxes
+
+    Accepts the same bodies as /api/detect_emotion; ?max_faces=N caps the
+    faces analyzed per frame.
+    """
+    try:
+        image = _request_image()
+        if image is None:
+            return jsonify({'error': 'No image data provided'}), 400
+
+        return jsonify(detect_faces(image, request.args.get('max_faces', type=int)))
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+def api_chat_stream():
+    """
+    Server-sent events stream of a Manassu reply for the React frontend
+
+    Body: {"message": str, "sessionId": str?, "history": [{"role", "content"}]?,
+    "emotion": str?}. Without a sessionId the server starts a chat under a new
+    one; with one it must have been issued by this server (403 otherwise),
+    and its server-side chat is reused and history ignored. Emits
+    `event: session` with {"sessionId"}, also sent as the X-Session-Id header,
+    then one `data: {"text": chunk}` event per chunk and `event: done`.
+    """
+    if not gemini_configured:
+        return jsonify({'error': 'Gemini API key is not configured'}), 503
+    data = request.get_json(silent=True)
+    if not data or not data.get('message'):
+        return jsonify({'error': 'No message provided'}), 400
+
+    prompt = data['message']
+    if data.get('emotion'):
+        prompt += f"\n\nNote: The user's current detected emotion is {data['emotion']}."
+    session_id = data.get('sessionId')
+    if session_id is None:
+        session_id = new_session_id()
+    elif not is_session_id(session_id):
+        return jsonify({'error': 'Unknown sessionId; omit it to start a new session'}), 403
+    chat = chat_sessions.get(session_id)
+    if chat is None:
+        # A new session, or one whose chat expired: the client's history re-seeds it
+        chat = ManassuChat(format_chat_history(data.get('history') or []))
+    chat_sessions.set(session_id, chat)
+
+    def events():
+        yield f"event: session\ndata: {json.dumps({'sessionId': session_id})}\n\n"
+        for chunk in chat.stream(prompt):
+            yield f"data: {json.dumps({'text': chunk})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Session-Id': session_id})
+
+
+@app.route('/api/analysis', methods=['POST'])
+def api_save_analysis():
+    """
+    Queue an emotion result for the local analysis store
+
+    Body: the result dict, plus optional "sessionId" and "forward" (also send
+    it to the Node backend when forwarding is configured). A sessionId must
+    have been issued by this server (403 otherwise); without one a new one is
+    issued. Returns 202 with {"queued", "sessionId"} once queued, 503 if the
+    write queue is full.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('primaryEmotion'), dict):
+        return jsonify({'error': 'No analysis provided'}), 400
+    try:
+        result = validate_result(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    session = data.get('sessionId')
+    if session is None:
+        session = new_session_id()
+    elif not is_session_id(session):
+        return jsonify({'error': 'Unknown sessionId; omit it to start a new session'}), 403
+    if not isinstance(result.get('source', ''), str):
+        return jsonify({'error': 'source must be a string'}), 400
+    if not get_store().append(result, session=session, forward=bool(data.get('forward'))):
+        return jsonify({'error': 'Analysis store is busy'}), 503
+    return jsonify({'queued': True, 'sessionId': session}), 202
+
+
+@app.route('/api/analysis', methods=['GET'])
+def api_analysis_history():
+    """
+    One session's stored results, newest first
+
+    ?sessionId= must be one issued by this server, so no caller can read
+    other sessions' history; ?since= and ?until= (epoch seconds) and ?limit=
+    (at most 1000) narrow it.
+    """
+    session = request.args.get('sessionId')
+    if not session:
+        return jsonify({'error': 'sessionId is required'}), 400
+    if not is_session_id(session):
+        return jsonify({'error': 'Unknown sessionId'}), 403
+    results = get_store().query(start=request.args.get('since', type=float),
+                                end=request.args.get('until', type=float),
+                                session=session,
+                                limit=max(1, min(request.args.get('limit', 100, type=int), 1000)))
+    return jsonify({'results': results})
+
+
+@app.route('/api/analysis/stats', methods=['GET'])
+def api_analysis_stats():
+    """Queue depth, write batches and forwarding counters of the analysis store"""
+    return jsonify(get_store().stats())
+
+
+@app.route('/api/ready', methods=['GET'])
+def api_ready():
+    """Readiness probe: 200 once the emotion model is loaded and warmed up"""
+    backend = get_backend()
+    engine = get_engine()
+    status = {
+        'ready': backend.ready,
+        'backend': backend.name,
+        'loadSeconds': engine.load_seconds,
+        'warmupSeconds': engine.warmup_seconds
+    }
+    return jsonify(status), 200 if backend.ready else 503
+
+
+@app.route('/api/batcher/stats', methods=['GET'])
+def api_batcher_stats():
+    """Queue depth and batch-size metrics of the request micro-batcher"""
+    return jsonify(get_batcher().stats())
+
+
+@app.route('/api/hybrid/stats', methods=['GET'])
+def api_hybrid_stats():
+    """Routing mode and Gemini circuit breaker state of the hybrid analyzer"""
+    return jsonify(get_analyzer(batched=True).stats())
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def api_cache_stats():
+    """Hit/miss counters and size of the emotion result and Gemini response caches"""
+    stats = get_result_cache().stats()
+    stats['gemini'] = gemini.response_cache.stats()
+    return jsonify(stats)
+
+
+def _cache_counters():
+    caches = {'emotion': get_result_cache().stats(), 'gemini': gemini.response_cache.stats()}
+    return [
+        ('neurasync_cache_hits_total', 'Cache hits.', 'cache',
+         {name: stats['hits'] for name, stats in caches.items()}),
+        ('neurasync_cache_misses_total', 'Cache misses.', 'cache',
+         {name: stats['misses'] for name, stats in caches.items()})
+    ]
+
+
+metrics.register_collector(_cache_counters)
+
+
+@app.route('/metrics', methods=['GET'])
+def api_metrics():
+    """
+    Stage latency histograms and event and cache counters in the Prometheus text format
+
+    Covers every worker of the server when NEURASYNC_METRICS_DIR is shared
+    by them (see neurasync.metrics); otherwise only the worker that answers.
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _profiler_allowed():
+    token = request.headers.get('X-Profiler-Token', '')
+    return PROFILER_TOKEN is not None and hmac.compare_digest(token.encode(), PROFILER_TOKEN.encode())
+
+
+@app.route('/api/profiler', methods=['GET'])
+def api_profiler():
+    """
+    Sampling profiler state and hottest functions; ?format=folded returns collapsed stacks
+
+    Requires the X-Profiler-Token header to match NEURASYNC_PROFILER_TOKEN.
+    """
+    if not _profiler_allowed():
+        return jsonify({'error': 'Profiler access requires a valid X-Profiler-Token'}), 403
+    profiler = get_profiler()
+    if request.args.get('format') == 'folded':
+        return Response(profiler.folded(), mimetype='text/plain')
+    return jsonify(profiler.stats())
+
+
+@app.route('/api/profiler', methods=['POST'])
+def api_profiler_toggle():
+    """
+    Start or stop the sampling profiler at runtime
+
+    Accepts JSON {"enabled": bool, "interval": seconds, "reset": bool} and
+    requires the X-Profiler-Token header. Under gunicorn it only affects the
+    worker that serves the request; use NEURASYNC_PROFILE=1 to profile all.
+    """
+    if not _profiler_allowed():
+        return jsonify({'error': 'Profiler access requires a valid X-Profiler-Token'}), 403
+    data = request.get_json(silent=True) or {}
+    profiler = get_profiler()
+    if data.get('reset'):
+        profiler.reset()
+    if data.get('enabled') is True:
+        interval = data.get('interval')
+        if interval is not None and not (isinstance(interval, (int, float)) and 0.001 <= interval <= 1):
+            return jsonify({'error': 'interval must be between 0.001 and 1 seconds'}), 400
+        profiler.start(interval)
+    elif data.get('enabled') is False:
+        profiler.stop()
+    return jsonify(profiler.stats())
+
+
+if Sock is not None:
+    sock = Sock(app)
+
+    @sock.route('/api/stream/emotion')
+    def api_stream_emotion(ws):
+        """
+        WebSocket stream: send frames (binary JPEG/PNG or base64 text), receive
+        one JSON result per analyzed frame. Frames arriving while the model is
+        busy are dropped. Query parameters: detect_every, fps, and store=1 to
+        keep every result in the analysis store under session, a server-issued
+        sessionId, or a new one returned in each result's "sessionId".
+        """
+        from neurasync.streaming import LatestFrame, track_emotions
+
+        store = get_store() if request.args.get('store') == '1' else None
+        session = request.args.get('session')
+        if store is not None:
+            if session is None:
+                session = new_session_id()
+            elif not is_session_id(session):
+                ws.send(json.dumps({'error': 'Unknown session; omit it to start a new session'}))
+                return
+        buffer = LatestFrame()
+
+        def receive():
+            try:
+                while True:
+                    frame = ws.receive()
+                    if frame is None:
+                        break
+                    buffer.put(frame)
+            except Exception:
+                pass
+            finally:
+                buffer.close()
+
+        threading.Thread(target=receive, name='emotion-ws-reader', daemon=True).start()
+        results = track_emotions(buffer,
+                                 detect_every=request.args.get('detect_every', 5, type=int),
+                                 target_fps=request.args.get('fps', 5.0, type=float))
+        try:
+            for result in results:
+                result['droppedFrames'] = buffer.dropped
+                if store is not None:
+                    store.append(result, session=session, source='stream')
+                    result['sessionId'] = session
+                ws.send(json.dumps(result))
+        finally:
+            buffer.close()
+
+
+def run_dev_server(host='0.0.0.0', port=8502):
+    """Run the Werkzeug development server (local use only)"""
+    if PROFILE_AT_START:
+        get_profiler().start()
+    app.run(host=host, port=port, threaded=True)
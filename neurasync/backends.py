@@ -0,0 +1,195 @@
+"""
+Execution backends for emotion analysis.
+
+inline   runs on the calling thread
+thread   splits batches across a thread pool sharing one model
+process  splits batches across worker processes, each holding its own warm
+         model; frames travel through shared memory instead of being pickled
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from neurasync.labels import EMOTION_LABELS
+
+
+def _chunks(items, n):
+    """Split items into at most n contiguous, nearly equal chunks"""
+    n = max(1, min(n, len(items)))
+    size, extra = divmod(len(items), n)
+    chunks, start = [], 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+class InlineBackend:
+    """Run analysis on the calling thread"""
+
+    name = 'inline'
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    @property
+    def ready(self):
+        return self.engine.ready
+
+    def warmup(self):
+        self.engine.warmup()
+
+    def analyze_batch(self, imgs):
+        return self.engine.analyze_batch(imgs)
+
+    def analyze_faces_batch(self, imgs, max_faces=None):
+        return self.engine.analyze_faces_batch(imgs, max_faces)
+
+    def classify_batch(self, faces):
+        return self.engine.classify(faces)
+
+    def shutdown(self):
+        pass
+
+
+class ThreadBackend(InlineBackend):
+    """Split batches across threads; OpenCV and TensorFlow release the GIL"""
+
+    name = 'thread'
+
+    def __init__(self, engine, workers):
+        super().__init__(engine)
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='emotion-worker')
+
+    def analyze_batch(self, imgs):
+        if len(imgs) <= 1:
+            return self.engine.analyze_batch(imgs)
+        parts = self._pool.map(self.engine.analyze_batch, _chunks(imgs, self.workers))
+        return np.concatenate(list(parts))
+
+    def analyze_faces_batch(self, imgs, max_faces=None):
+        if len(imgs) <= 1:
+            return self.engine.analyze_faces_batch(imgs, max_faces)
+        parts = self._pool.map(lambda chunk: self.engine.analyze_faces_batch(chunk, max_faces),
+                               _chunks(imgs, self.workers))
+        return [faces for part in parts for faces in part]
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+def _pack(imgs):
+    """Copy frames into one shared-memory block and return it with per-frame layouts"""
+    total = sum(img.nbytes for img in imgs)
+    shm = shared_memory.SharedMemory(create=True, size=max(total, 1))
+    layouts, offset = [], 0
+    for img in imgs:
+        img = np.ascontiguousarray(img, dtype=np.uint8)
+        np.ndarray(img.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)[...] = img
+        layouts.append((offset, img.shape))
+        offset += img.nbytes
+    return shm, layouts
+
+
+def _init_worker():
+    from neurasync.emotion import get_engine
+
+    get_engine().warmup()
+
+
+def _analyze_shared(shm_name, layouts, method, *args):
+    from neurasync.emotion import get_engine
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        imgs = [np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+                for offset, shape in layouts]
+        results = getattr(get_engine(), method)(imgs, *args)
+        del imgs
+        return results
+    finally:
+        shm.close()
+
+
+def _ping():
+    return os.getpid()
+
+
+class ProcessBackend:
+    """Split batches across worker processes that each hold a warm model"""
+
+    name = 'process'
+
+    def __init__(self, workers):
+        from concurrent.futures import ProcessPoolExecutor
+
+        self.workers = workers
+        # spawn, not fork: the parent may already hold TensorFlow state
+        self._pool = ProcessPoolExecutor(max_workers=workers,
+                                         mp_context=multiprocessing.get_context('spawn'),
+                                         initializer=_init_worker)
+        self._ready = threading.Event()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def warmup(self):
+        """Start every worker; each one loads and warms its model in the initializer"""
+        futures = [self._pool.submit(_ping) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+        self._ready.set()
+
+    def _map_shared(self, imgs, method, *args):
+        blocks = []
+        try:
+            futures = []
+            for chunk in _chunks(imgs, self.workers):
+                shm, layouts = _pack(chunk)
+                blocks.append(shm)
+                futures.append(self._pool.submit(_analyze_shared, shm.name, layouts, method, *args))
+            return [future.result() for future in futures]
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+    def analyze_batch(self, imgs):
+        if not imgs:
+            return np.empty((0, len(EMOTION_LABELS)), dtype=np.float32)
+        return np.concatenate(self._map_shared(imgs, 'analyze_batch'))
+
+    def analyze_faces_batch(self, imgs, max_faces=None):
+        """Per-frame (box, scores) lists, detected and classified in the workers"""
+        if not imgs:
+            return []
+        return [faces for part in self._map_shared(imgs, 'analyze_faces_batch', max_faces) for faces in part]
+
+    def classify_batch(self, faces):
+        """Scores of face crops, classified in the workers without detection"""
+        if not faces:
+            return np.empty((0, len(EMOTION_LABELS)), dtype=np.float32)
+        return np.concatenate(self._map_shared(faces, 'classify'))
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def create_backend(kind, engine, workers=None):
+    """Build a backend by name: inline, thread or process"""
+    workers = workers or os.cpu_count() or 1
+    if kind == 'inline':
+        return InlineBackend(engine)
+    if kind == 'thread':
+        return ThreadBackend(engine, workers)
+    if kind == 'process':
+        return ProcessBackend(workers)
+    raise ValueError(f"Unknown emotion backend: {kind}")
@@ -0,0 +1,366 @@
+"""
+Offline emotion analysis of image directories and recorded videos.
+
+    python -m neurasync.batch INPUT OUTPUT [--fps 2] [--format jsonl|csv|parquet] [--resume]
+
+INPUT is an image, a video, or a directory walked recursively for both.
+Videos are sampled at --fps frames per second of footage and decoded in
+order as they are read; skipped frames are grabbed without decoding. Images
+are read and decoded on a thread pool. Frames are classified in batches on
+the selected backend (process by default, one warm model per core). Results
+are written incrementally as one flat row per frame, so memory stays
+constant however many frames there are.
+
+Every --flush-every rows the output is flushed and a checkpoint is written
+next to it (OUTPUT.checkpoint.json). --resume continues after the last
+checkpointed frame and drops any rows written after it; it fails if that
+frame's file is no longer under INPUT or OUTPUT is shorter than the
+checkpoint. A run without --resume deletes any old checkpoint. Parquet
+output is a directory of part files sharing one schema and needs pyarrow.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from neurasync.backends import create_backend
+from neurasync.emotion import build_results, get_engine
+from neurasync.labels import EMOTION_LABELS
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff'}
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v'}
+
+FORMATS = ('jsonl', 'csv', 'parquet')
+
+COLUMNS = (['source', 'frame', 'timestamp', 'primaryEmotion', 'primaryConfidence',
+            'secondaryEmotion', 'secondaryConfidence', 'stressLevel']
+           + list(EMOTION_LABELS) + ['error'])
+
+# Arrow type name of every column, so parts whose rows are all null still unify
+COLUMN_TYPES = {'source': 'string', 'frame': 'int64', 'timestamp': 'float64',
+                'primaryEmotion': 'string', 'primaryConfidence': 'int64',
+                'secondaryEmotion': 'string', 'secondaryConfidence': 'int64',
+                'stressLevel': 'int64', 'error': 'string'}
+COLUMN_TYPES.update(dict.fromkeys(EMOTION_LABELS, 'float64'))
+
+
+def _extension(path):
+    return os.path.splitext(path)[1].lower()
+
+
+def list_media(root):
+    """Yield image and video paths under root in a stable order"""
+    if os.path.isfile(root):
+        yield root
+        return
+    for directory, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            if _extension(name) in IMAGE_EXTENSIONS | VIDEO_EXTENSIONS:
+                yield os.path.join(directory, name)
+
+
+def iter_video(path, fps=None, start_frame=0):
+    """Yield (frame index, timestamp, BGR frame) sampled at fps from start_frame on"""
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video {path}")
+    try:
+        source_fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        step = max(1, int(round(source_fps / fps))) if fps else 1
+        # Resume on the next sampled frame
+        index = -(-start_frame // step) * step
+        if index:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+        while True:
+            if not capture.grab():
+                return
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    yield index, round(index / source_fps, 3), frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def iter_items(root, fps=None, checkpoint=None):
+    """
+    Yield (source, frame, timestamp, loader) for every frame to analyze
+
+    loader returns the BGR frame (or None if unreadable); images are only
+    read when their batch is decoded. With a checkpoint, everything up to and
+    including its last frame is skipped without being read.
+    """
+    resume_source = checkpoint['source'] if checkpoint else None
+    resume_frame = checkpoint['frame'] if checkpoint else None
+
+    for path in list_media(root):
+        start_frame = 0
+        if resume_source is not None:
+            if path != resume_source:
+                continue
+            resume_source = None
+            if resume_frame is None:
+                continue
+            start_frame = resume_frame + 1
+
+        if _extension(path) in VIDEO_EXTENSIONS:
+            try:
+                for index, timestamp, frame in iter_video(path, fps, start_frame):
+                    yield path, index, timestamp, (lambda frame=frame: frame)
+            except ValueError as e:
+                print(f"Skipping {path}: {str(e)}", file=sys.stderr)
+        else:
+            yield path, None, None, (lambda path=path: cv2.imread(path, cv2.IMREAD_COLOR))
+
+
+def to_row(source, frame, timestamp, result=None, error=None):
+    """Flatten one result into a row with COLUMNS keys"""
+    row = dict.fromkeys(COLUMNS)
+    row.update(source=source, frame=frame, timestamp=timestamp, error=error)
+    if result is not None:
+        row.update(primaryEmotion=result['primaryEmotion']['name'],
+                   primaryConfidence=result['primaryEmotion']['confidence'],
+                   secondaryEmotion=result['secondaryEmotion']['name'],
+                   secondaryConfidence=result['secondaryEmotion']['confidence'],
+                   stressLevel=result['stressLevel'])
+        row.update(result['emotions'])
+    return row
+
+
+class JsonlWriter:
+    """Append rows as JSON lines; the checkpoint state is the file offset"""
+
+    def __init__(self, path, state=None):
+        self.path = path
+        self._file = open(path, 'a+b' if state else 'wb')
+        if state:
+            self._file.truncate(state['offset'])
+        self._file.seek(0, os.SEEK_END)
+
+    def _encode(self, rows):
+        return b''.join(json.dumps(row).encode() + b'\n' for row in rows)
+
+    def write(self, rows):
+        self._file.write(self._encode(rows))
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {'offset': self._file.tell()}
+
+    def close(self):
+        self._file.close()
+
+
+class CsvWriter(JsonlWriter):
+    """Append rows as CSV with a header line"""
+
+    def __init__(self, path, state=None):
+        super().__init__(path, state)
+        if not state:
+            self._file.write(self._encode([dict(zip(COLUMNS, COLUMNS))]))
+
+    def _encode(self, rows):
+        lines = _Lines()
+        writer = csv.DictWriter(lines, COLUMNS)
+        writer.writerows(rows)
+        return ''.join(lines).encode()
+
+
+class _Lines(list):
+    """File-like sink for csv.writer"""
+
+    def write(self, line):
+        self.append(line)
+
+
+class ParquetWriter:
+    """Write each flushed batch of rows as a new part file in a directory"""
+
+    def __init__(self, path, state=None):
+        import pyarrow as pa
+
+        self._pa = pa
+        self.schema = pa.schema([(column, getattr(pa, COLUMN_TYPES[column])()) for column in COLUMNS])
+        self.path = path
+        self.part = state['part'] if state else 0
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            # Parts at or past the checkpoint were never acknowledged
+            if name.startswith('part-') and int(name[5:11]) >= self.part:
+                os.remove(os.path.join(path, name))
+        self._rows = []
+
+    def write(self, rows):
+        self._rows.extend(rows)
+
+    def flush(self):
+        if self._rows:
+            import pyarrow.parquet as pq
+
+            table = self._pa.Table.from_pylist(self._rows, schema=self.schema)
+            pq.write_table(table, os.path.join(self.path, f'part-{self.part:06d}.parquet'))
+            self.part += 1
+            self._rows = []
+        return {'part': self.part}
+
+    def close(self):
+        self.flush()
+
+
+WRITERS = {
+    'jsonl': JsonlWriter,
+    'csv': CsvWriter,
+    'parquet': ParquetWriter,
+}
+
+
+def checkpoint_path(output):
+    return output.rstrip('/\\') + '.checkpoint.json'
+
+
+def load_checkpoint(output, input_path):
+    path = checkpoint_path(output)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('input') != os.path.abspath(input_path):
+        raise ValueError(f"Checkpoint {path} belongs to a different input: {checkpoint.get('input')}")
+    # Resuming skips everything up to this file; if it is gone nothing would be analyzed
+    if checkpoint['source'] not in list_media(input_path):
+        raise ValueError(f"Checkpoint {path} resumes after {checkpoint['source']}, which is no longer "
+                         f"in {input_path}; delete the checkpoint to start over")
+    offset = checkpoint['writer'].get('offset')
+    size = os.path.getsize(output) if os.path.isfile(output) else 0
+    if offset is not None and offset > size:
+        raise ValueError(f"Checkpoint {path} expects {offset} bytes of output but {output} has {size}; "
+                         f"delete the checkpoint to start over")
+    return checkpoint
+
+
+def clear_checkpoint(output):
+    try:
+        os.remove(checkpoint_path(output))
+    except FileNotFoundError:
+        pass
+
+
+def save_checkpoint(output, checkpoint):
+    path = checkpoint_path(output)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, path)
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _load(item):
+    try:
+        return item[3]()
+    except Exception:
+        return None
+
+
+def run(input_path, output, fmt='jsonl', fps=None, batch_size=32, backend='process', workers=None,
+        flush_every=1000, resume=False):
+    """Analyze every frame under input_path into output; return the number of rows written this run"""
+    if resume:
+        checkpoint = load_checkpoint(output, input_path)
+    else:
+        # A fresh run overwrites the output, so an old checkpoint no longer describes it
+        clear_checkpoint(output)
+        checkpoint = None
+    writer = WRITERS[fmt](output, checkpoint['writer'] if checkpoint else None)
+    rows_total = checkpoint['rows'] if checkpoint else 0
+
+    engine = create_backend(backend, get_engine(), workers)
+    engine.warmup()
+    decode_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='batch-decode')
+
+    written = pending = 0
+    last = None
+    start = time.perf_counter()
+    try:
+        for batch in _batches(iter_items(input_path, fps, checkpoint), batch_size):
+            frames = list(decode_pool.map(_load, batch))
+            valid = [i for i, frame in enumerate(frames) if frame is not None]
+            results = build_results(engine.analyze_batch([frames[i] for i in valid])) if valid else []
+            by_index = dict(zip(valid, results))
+            rows = [to_row(source, frame, timestamp, by_index.get(i),
+                           None if i in by_index else 'unreadable image')
+                    for i, (source, frame, timestamp, _) in enumerate(batch)]
+            writer.write(rows)
+            written += len(rows)
+            pending += len(rows)
+            last = batch[-1]
+
+            if pending >= flush_every:
+                save_checkpoint(output, {
+                    'input': os.path.abspath(input_path), 'source': last[0], 'frame': last[1],
+                    'rows': rows_total + written, 'writer': writer.flush()})
+                pending = 0
+                rate = written / (time.perf_counter() - start)
+                print(f"{rows_total + written} frames ({rate:.1f}/s), at {last[0]}", file=sys.stderr)
+
+        if last is not None:
+            save_checkpoint(output, {
+                'input': os.path.abspath(input_path), 'source': last[0], 'frame': last[1],
+                'rows': rows_total + written, 'writer': writer.flush()})
+    finally:
+        writer.close()
+        decode_pool.shutdown()
+        engine.shutdown()
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch emotion analysis of image directories and videos")
+    parser.add_argument('input', help="image, video, or directory of images and videos")
+    parser.add_argument('output', help="output file (jsonl, csv) or directory (parquet)")
+    parser.add_argument('--format', choices=FORMATS,
+                        help="output format (default: from the output extension, else jsonl)")
+    parser.add_argument('--fps', type=float, default=1.0,
+                        help="frames sampled per second of video (0 for every frame)")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--backend', default='process', choices=('inline', 'thread', 'process'))
+    parser.add_argument('--workers', type=int, help="backend workers (default: CPU count)")
+    parser.add_argument('--flush-every', type=int, default=1000,
+                        help="rows between output flushes and checkpoints")
+    parser.add_argument('--resume', action='store_true', help="continue from the last checkpoint")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or next((f for f in FORMATS if args.output.rstrip('/').endswith('.' + f)), 'jsonl')
+    if not os.path.exists(args.input):
+        parser.error(f"No such input: {args.input}")
+    if args.resume:
+        try:
+            load_checkpoint(args.output, args.input)
+        except ValueError as e:
+            parser.error(str(e))
+    written = run(args.input, args.output, fmt, args.fps or None, args.batch_size, args.backend,
+                  args.workers, args.flush_every, args.resume)
+    print(f"Wrote {written} rows to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
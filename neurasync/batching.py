@@ -0,0 +1,113 @@
+"""
+Dynamic micro-batching in front of a batch function.
+
+Concurrent callers submit single items; a worker thread collects them for
+up to max_wait_ms or until max_batch_size items are queued, runs one
+batched call and hands each caller its own result through a Future.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-item calls into batched calls of batch_fn"""
+
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=10, name='micro-batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._cancelled = 0
+        self._batch_size_counts = {}
+        self._max_queue_depth = 0
+        self._wait_ms_total = 0.0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue one item and return a Future for its result"""
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        depth = self._queue.qsize()
+        if depth > self._max_queue_depth:
+            with self._stats_lock:
+                self._max_queue_depth = max(self._max_queue_depth, depth)
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submit an item and block until its result is ready, at most timeout seconds"""
+        future = self.submit(item)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # Succeeds unless the worker already took the item into a batch;
+            # a cancelled item is dropped from the queue without being computed
+            future.cancel()
+            raise
+
+    def _claim(self, entry, batch):
+        # Mark the future running so it can no longer be cancelled, or drop it if it was
+        if entry[1].set_running_or_notify_cancel():
+            batch.append(entry)
+        else:
+            with self._stats_lock:
+                self._cancelled += 1
+
+    def _collect(self):
+        batch = []
+        while not batch:
+            self._claim(self._queue.get(), batch)
+        deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                self._claim(self._queue.get(timeout=remaining), batch)
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _, _ in batch]
+            started = time.perf_counter()
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"Batch function returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_size_counts[len(batch)] = self._batch_size_counts.get(len(batch), 0) + 1
+                self._wait_ms_total += sum(started - queued for _, _, queued in batch) * 1000.0
+
+    def stats(self):
+        """Return queue depth and batch-size metrics for tuning the window"""
+        with self._stats_lock:
+            return {
+                'queueDepth': self._queue.qsize(),
+                'maxQueueDepth': self._max_queue_depth,
+                'batches': self._batches,
+                'items': self._items,
+                'cancelled': self._cancelled,
+                'meanBatchSize': self._items / self._batches if self._batches else 0.0,
+                'meanQueueWaitMs': self._wait_ms_total / self._items if self._items else 0.0,
+                'batchSizeCounts': dict(sorted(self._batch_size_counts.items())),
+                'maxBatchSize': self.max_batch_size,
+                'maxWaitMs': self.max_wait_ms
+            }
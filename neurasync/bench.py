@@ -0,0 +1,400 @@
+"""
+Offline benchmarks for the emotion and chat hot paths.
+
+    python -m neurasync.bench [--images DIR] [--engine onnx] [--output run.json]
+    python -m neurasync.bench compare BASELINE.json CANDIDATE.json [--tolerance 0.1]
+
+Runs without network access: faces are synthetic unless --images points at
+local samples, and Gemini is replaced by a stub that answers after
+--gemini-latency-ms. The report is JSON:
+
+coldStart    import, model load and warm-up seconds, in a fresh process
+latency      warm detect_emotion p50/p95/p99 per image, result cache off
+throughput   images/s through the micro-batcher at each --concurrency level
+encoding     image_to_base64 and base64 decode latency
+chat         format_chat_history and stubbed ManassuChat turn latency
+api          requests/s and latency of a live HTTP server under load
+peakRssMb    peak resident memory of the benchmark process
+
+--engine stub swaps the emotion model for a constant-time stub to isolate
+pipeline overhead. compare exits non-zero if any latency grew, or any rate
+fell, by more than the tolerance.
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+class StubClassifier:
+    """Constant-time stand-in for the emotion model"""
+
+    name = 'stub'
+
+    def predict(self, batch):
+        scores = np.full((len(batch), 7), 0.05, dtype=np.float32)
+        scores[:, 3] = 0.7
+        return scores
+
+
+class _StubChat:
+    def __init__(self, history, latency):
+        self.history = list(history)
+        self.last = None
+        self.latency = latency
+
+    def send_message(self, prompt, stream=False):
+        time.sleep(self.latency)
+        reply = _StubResponse("Thank you for sharing that. How are you feeling right now?")
+        return [reply] if stream else reply
+
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+        self.candidates = [_StubCandidate()]
+
+
+class _StubCandidate:
+    class content:
+        parts = [True]
+
+
+class StubGeminiModel:
+    """Answers every chat turn with canned text after a fixed delay"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def start_chat(self, history=None):
+        return _StubChat(history or [], self.latency)
+
+    def generate_content(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return _StubResponse("Summary of the conversation so far.")
+
+
+def _install_stubs(engine, gemini_latency):
+    from neurasync import classifiers, gemini
+
+    classifiers.CLASSIFIERS['stub'] = StubClassifier
+    os.environ['NEURASYNC_EMOTION_ENGINE'] = engine
+    stub = StubGeminiModel(gemini_latency)
+    gemini.get_model = lambda *args, **kwargs: stub
+    gemini._configured = True
+
+
+def synthetic_faces(n, size=(480, 640), seed=0):
+    """Draw n varied cartoon faces on noisy backgrounds as BGR frames"""
+    rng = np.random.default_rng(seed)
+    height, width = size
+    faces = []
+    for _ in range(n):
+        img = rng.integers(40, 90, (height, width, 3), dtype=np.uint8)
+        cx, cy = int(width * rng.uniform(0.35, 0.65)), int(height * rng.uniform(0.4, 0.6))
+        rx, ry = int(width * rng.uniform(0.12, 0.18)), int(height * rng.uniform(0.22, 0.3))
+        skin = tuple(int(c) for c in rng.integers(120, 220, 3))
+        cv2.ellipse(img, (cx, cy), (rx, ry), 0, 0, 360, skin, -1)
+        for dx in (-rx // 2, rx // 2):
+            cv2.circle(img, (cx + dx, cy - ry // 4), max(2, rx // 8), (30, 30, 30), -1)
+        smile = int(rng.uniform(-1, 1) * ry // 6)
+        cv2.ellipse(img, (cx, cy + ry // 2), (rx // 2, abs(smile) + 2), 0,
+                    0 if smile >= 0 else 180, 180 if smile >= 0 else 360, (40, 40, 120), 3)
+        faces.append(img)
+    return faces
+
+
+def _load_images(directory, limit):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        img = cv2.imread(os.path.join(directory, name), cv2.IMREAD_COLOR)
+        if img is not None:
+            images.append(img)
+        if len(images) == limit:
+            break
+    return images
+
+
+def _percentiles(timings_ms):
+    p50, p95, p99 = np.percentile(timings_ms, [50, 95, 99])
+    return {
+        'p50Ms': round(float(p50), 3),
+        'p95Ms': round(float(p95), 3),
+        'p99Ms': round(float(p99), 3),
+        'meanMs': round(float(np.mean(timings_ms)), 3),
+        'samples': len(timings_ms)
+    }
+
+
+def _time_calls(fn, items, repeats):
+    timings = []
+    for _ in range(repeats):
+        for item in items:
+            start = time.perf_counter()
+            fn(item)
+            timings.append((time.perf_counter() - start) * 1000.0)
+    return _percentiles(timings)
+
+
+def peak_rss_mb():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return round(usage.ru_maxrss / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0), 1)
+
+
+def _cold_start_child(engine):
+    """Measure import, load and warm-up in this (fresh) process and print JSON"""
+    start = time.perf_counter()
+    _install_stubs(engine, 0.0)
+    from neurasync.emotion import get_engine
+    imported = time.perf_counter()
+    emotion_engine = get_engine()
+    emotion_engine.warmup()
+    print(json.dumps({
+        'importSeconds': round(imported - start, 3),
+        'loadSeconds': round(emotion_engine.load_seconds, 3),
+        'warmupSeconds': round(emotion_engine.warmup_seconds, 3),
+        'totalSeconds': round(time.perf_counter() - start, 3),
+        'peakRssMb': peak_rss_mb()
+    }))
+
+
+def bench_cold_start(engine):
+    output = subprocess.run([sys.executable, '-m', 'neurasync.bench', '_cold-start', '--engine', engine],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_latency(encoded, repeats):
+    from neurasync.emotion import detect_emotion
+
+    return _time_calls(detect_emotion, encoded, repeats)
+
+
+def bench_throughput(encoded, levels, requests_per_level):
+    from neurasync.emotion import detect_emotion_batched, get_batcher
+
+    report = {}
+    for level in levels:
+        jobs = [encoded[i % len(encoded)] for i in range(max(requests_per_level, level))]
+        timings = []
+
+        def call(image):
+            start = time.perf_counter()
+            detect_emotion_batched(image)
+            timings.append((time.perf_counter() - start) * 1000.0)
+
+        with ThreadPoolExecutor(max_workers=level) as pool:
+            start = time.perf_counter()
+            list(pool.map(call, jobs))
+            elapsed = time.perf_counter() - start
+        report[str(level)] = dict(_percentiles(timings), imagesPerSecond=round(len(jobs) / elapsed, 2))
+    report['batcher'] = get_batcher().stats()
+    return report
+
+
+def bench_encoding(frames, repeats):
+    from PIL import Image
+
+    from neurasync.emotion import image_to_base64, load_image
+
+    pil_images = [Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in frames]
+    encoded = [image_to_base64(image) for image in pil_images]
+    return {
+        'imageToBase64': _time_calls(image_to_base64, pil_images, repeats),
+        'decodeBase64': _time_calls(load_image, encoded, repeats)
+    }
+
+
+def bench_chat(turns, repeats):
+    from neurasync.gemini import ManassuChat, format_chat_history
+
+    messages = [{"role": "user" if i % 2 == 0 else "assistant",
+                 "content": f"Message {i} about how the day went and what felt hard."}
+                for i in range(turns)]
+    history = format_chat_history(messages)
+    prompts = [f"Follow-up question {i}" for i in range(repeats)]
+    chat = ManassuChat(history)
+    # Distinct openers so the opening-reply cache never answers
+    openers = [f"Opening message {i}" for i in range(repeats)]
+    return {
+        'formatChatHistory': _time_calls(format_chat_history, [messages], repeats),
+        'send': _time_calls(chat.send, prompts, 1),
+        'stream': _time_calls(lambda prompt: list(chat.stream(prompt)), prompts, 1),
+        'streamFirstTurn': _time_calls(lambda prompt: list(ManassuChat().stream(prompt)), openers, 1)
+    }
+
+
+def _serve_api():
+    import logging
+
+    from werkzeug.serving import make_server
+
+    from neurasync import api
+
+    # The stub stands in for a configured Gemini key
+    api.gemini_configured = True
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-api', daemon=True).start()
+    return server
+
+
+def _post(port, path, body, content_type):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        start = time.perf_counter()
+        connection.request('POST', path, body=body, headers={'Content-Type': content_type})
+        response = connection.getresponse()
+        response.read()
+        elapsed = (time.perf_counter() - start) * 1000.0
+        return elapsed, response.status
+    finally:
+        connection.close()
+
+
+def bench_api(jpegs, concurrency, requests_total):
+    server = _serve_api()
+    port = server.server_port
+    targets = {
+        'detectEmotion': ('/api/detect_emotion?mode=local', lambda i: jpegs[i % len(jpegs)], 'image/jpeg'),
+        # Distinct messages, so the opening-turn cache does not answer
+        'chatStream': ('/api/chat/stream', lambda i: json.dumps({"message": f"I feel anxious today ({i})"}),
+                       'application/json'),
+    }
+    report = {}
+    try:
+        for name, (path, body, content_type) in targets.items():
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                start = time.perf_counter()
+                results = list(pool.map(lambda i: _post(port, path, body(i), content_type), range(requests_total)))
+                elapsed = time.perf_counter() - start
+            report[name] = dict(_percentiles([ms for ms, _ in results]),
+                                requestsPerSecond=round(requests_total / elapsed, 2),
+                                errors=sum(status != 200 for _, status in results),
+                                concurrency=concurrency)
+    finally:
+        server.shutdown()
+    return report
+
+
+def run(args):
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'engine': args.engine,
+        'detector': os.environ.get('NEURASYNC_DETECTOR', 'haar'),
+        'backend': os.environ.get('NEURASYNC_BACKEND', 'inline'),
+    }
+    report['coldStart'] = bench_cold_start(args.engine)
+
+    _install_stubs(args.engine, args.gemini_latency_ms / 1000.0)
+    frames = _load_images(args.images, args.count) if args.images else synthetic_faces(args.count)
+    if not frames:
+        raise ValueError(f"No readable images in {args.images}")
+    jpegs = [cv2.imencode('.jpg', frame)[1].tobytes() for frame in frames]
+    encoded = [base64.b64encode(jpeg).decode() for jpeg in jpegs]
+
+    from neurasync.emotion import start_engine
+    start_engine(background=False)
+
+    report['latency'] = bench_latency(encoded, args.repeats)
+    report['throughput'] = bench_throughput(encoded, args.concurrency, args.requests)
+    report['encoding'] = bench_encoding(frames, args.repeats)
+    report['chat'] = bench_chat(args.chat_turns, args.repeats)
+    report['api'] = bench_api(jpegs, max(args.concurrency), args.requests)
+    report['peakRssMb'] = peak_rss_mb()
+    return report
+
+
+def _metrics(report, prefix=''):
+    """Flatten a report to {dotted.path: value} for the comparable metrics"""
+    metrics = {}
+    for key, value in report.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            metrics.update(_metrics(value, path + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool) and \
+                key.endswith(('Ms', 'Seconds', 'PerSecond', 'RssMb')):
+            metrics[path] = value
+    return metrics
+
+
+def compare(baseline, candidate, tolerance=0.1):
+    """Return [(metric, baseline, candidate, change)] for metrics worse by more than tolerance"""
+    base, new = _metrics(baseline), _metrics(candidate)
+    regressions = []
+    for name, old in sorted(base.items()):
+        if name not in new or not old:
+            continue
+        change = (new[name] - old) / old
+        # Rates regress when they fall; latencies, durations and memory when they grow
+        worse = -change if name.endswith('PerSecond') else change
+        if worse > tolerance:
+            regressions.append((name, old, new[name], round(change, 3)))
+    return regressions
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['compare']:
+        parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+        parser.add_argument('baseline')
+        parser.add_argument('candidate')
+        parser.add_argument('--tolerance', type=float, default=0.1,
+                            help="allowed relative change before a metric counts as a regression")
+        args = parser.parse_args(argv[1:])
+        with open(args.baseline) as f, open(args.candidate) as g:
+            regressions = compare(json.load(f), json.load(g), args.tolerance)
+        for name, old, new, change in regressions:
+            print(f"REGRESSION {name}: {old} -> {new} ({change:+.1%})")
+        print("OK" if not regressions else f"{len(regressions)} regressions")
+        return 1 if regressions else 0
+
+    parser = argparse.ArgumentParser(description="Benchmark emotion detection and chat hot paths offline")
+    parser.add_argument('mode', nargs='?', choices=('_cold-start',), help=argparse.SUPPRESS)
+    parser.add_argument('--images', help="directory of sample face images (default: synthetic faces)")
+    parser.add_argument('--count', type=int, default=32, help="images to benchmark with")
+    parser.add_argument('--engine', default=os.environ.get('NEURASYNC_EMOTION_ENGINE', 'deepface'),
+                        help="emotion engine: deepface, onnx, opencv-dnn or stub")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--concurrency', default='1,4,16',
+                        type=lambda value: [int(level) for level in value.split(',')])
+    parser.add_argument('--requests', type=int, default=200, help="requests per throughput level")
+    parser.add_argument('--chat-turns', type=int, default=40, help="messages in the benchmark chat history")
+    parser.add_argument('--gemini-latency-ms', type=float, default=50.0, help="stubbed Gemini response time")
+    parser.add_argument('--cache', action='store_true', help="keep the emotion result cache on")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    if not args.cache:
+        os.environ['NEURASYNC_CACHE_SIZE'] = '0'
+    if args.mode == '_cold-start':
+        _cold_start_child(args.engine)
+        return 0
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Bounded result caches.
+
+LRUCache is a thread-safe LRU map with an optional TTL and hit/miss
+counters. image_key and perceptual_key derive cache keys from decoded
+frames, so the same picture sent as base64, bytes or an array shares an entry.
+DiskCache is an SQLite-backed LRU/TTL store, readable only by its owner, for
+results worth keeping across restarts, and ResponseCache layers both behind
+single-flight coalescing of concurrent identical requests.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional time-to-live"""
+
+    def __init__(self, max_entries=1024, ttl_seconds=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default on a miss or expired entry"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires = entry
+                if expires is None or expires > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'maxEntries': self.max_entries,
+                'ttlSeconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+
+def image_key(img):
+    """Exact content key of a decoded frame"""
+    digest = hashlib.blake2b(np.ascontiguousarray(img).data, digest_size=16)
+    digest.update(repr(img.shape).encode())
+    return digest.hexdigest()
+
+
+def perceptual_key(img):
+    """64-bit difference hash; near-identical frames (recompression, noise) share a key"""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return f"p{int(np.packbits(bits).view('>u8')[0]):016x}"
+
+
+class DiskCache:
+    """SQLite-backed cache of JSON-serializable values with LRU size limit and TTL"""
+
+    def __init__(self, path, max_entries=10000, ttl_seconds=None):
+        # Entries can hold chat replies: directory 0700, database 0600 (SQLite
+        # gives its -wal and -shm files the database's permissions)
+        os.makedirs(os.path.dirname(path) or '.', mode=0o700, exist_ok=True)
+        os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        os.chmod(path, 0o600)  # a cache file from an older version may be wider
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS cache '
+                         '(key TEXT PRIMARY KEY, value TEXT, expires REAL, used REAL)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS cache_used ON cache (used)')
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return default
+            value, expires = row
+            if expires is not None and expires <= now:
+                self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+                return default
+            self._db.execute('UPDATE cache SET used = ? WHERE key = ?', (now, key))
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        expires = now + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)',
+                             (key, json.dumps(value), expires, now))
+            count = self._db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+            if count > self.max_entries:
+                self._db.execute('DELETE FROM cache WHERE key IN '
+                                 '(SELECT key FROM cache ORDER BY used LIMIT ?)', (count - self.max_entries,))
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM cache')
+
+
+class ResponseCache:
+    """
+    Memory LRU, optional disk tier, and single-flight coalescing
+
+    get_or_compute runs compute at most once for concurrent callers with the
+    same key; the others wait for and share its result. Only successful
+    results are cached.
+    """
+
+    def __init__(self, max_entries=512, ttl_seconds=None, disk_path=None):
+        self.memory = LRUCache(max_entries, ttl_seconds)
+        self.disk = DiskCache(disk_path, ttl_seconds=ttl_seconds) if disk_path else None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return future.result()
+
+        try:
+            value = compute()
+            self.set(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats['coalesced'] = self.coalesced
+        stats['disk'] = self.disk is not None
+        return stats
+
+
+def request_key(model_name, prompt, image_bytes=None, context=None):
+    """Cache key for a model request: normalized prompt, image content hash and model"""
+    digest = hashlib.blake2b(digest_size=20)
+    for part in (model_name, " ".join(prompt.split()), context or ""):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    if image_bytes is not None:
+        digest.update(hashlib.blake2b(image_bytes, digest_size=16).digest())
+    return digest.hexdigest()
@@ -0,0 +1,236 @@
+"""
+Interchangeable emotion classifiers behind the EmotionEngine.
+
+deepface    DeepFace's Keras/TensorFlow emotion network (default)
+onnx        the same network exported to ONNX, run with ONNX Runtime;
+            optionally int8-quantized, with configurable intra-op threads
+opencv-dnn  the exported ONNX model run with OpenCV's DNN module
+
+Every classifier takes an (N, 48, 48, 1) float32 batch of grayscale faces in
+[0, 1] and returns (N, 7) probabilities in EMOTION_LABELS order, so the result
+schema does not depend on the engine.
+
+    python -m neurasync.classifiers export models/emotion.onnx [--int8]
+    python -m neurasync.classifiers parity IMAGE_DIR --engine onnx
+
+export converts the DeepFace model; parity compares an engine's top-1 label,
+score error and latency against DeepFace on a local sample set.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+FACE_INPUT_SIZE = (48, 48)
+
+EMOTION_MODEL = os.environ.get('NEURASYNC_EMOTION_MODEL', 'models/emotion.onnx')
+EMOTION_MODEL_INT8 = os.environ.get('NEURASYNC_EMOTION_MODEL_INT8', '0') == '1'
+INTRA_OP_THREADS = int(os.environ.get('NEURASYNC_INTRA_OP_THREADS', '0'))
+
+
+def preprocess_faces(faces):
+    """Stack BGR face crops into an (N, 48, 48, 1) float32 batch in [0, 1]"""
+    batch = np.empty((len(faces),) + FACE_INPUT_SIZE + (1,), dtype=np.float32)
+    for i, face in enumerate(faces):
+        gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY) if face.ndim == 3 else face
+        batch[i, :, :, 0] = cv2.resize(gray, FACE_INPUT_SIZE, interpolation=cv2.INTER_AREA)
+    batch /= 255.0
+    return batch
+
+
+def build_deepface_model():
+    """Load the DeepFace emotion network and return the underlying Keras model"""
+    from deepface import DeepFace
+
+    try:
+        client = DeepFace.build_model(model_name='Emotion', task='facial_attribute')
+    except TypeError:
+        # deepface < 0.0.90 has no task argument
+        client = DeepFace.build_model('Emotion')
+    return getattr(client, 'model', client)
+
+
+class DeepFaceClassifier:
+    """DeepFace's Keras emotion model"""
+
+    name = 'deepface'
+
+    def __init__(self):
+        self._model = build_deepface_model()
+
+    def predict(self, batch):
+        return np.asarray(self._model.predict_on_batch(batch), dtype=np.float32)
+
+
+def quantize_model(model_path, output_path=None):
+    """Write a dynamically int8-quantized copy of an ONNX model and return its path"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    output_path = output_path or model_path.replace('.onnx', '.int8.onnx')
+    quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+    return output_path
+
+
+def _require_model(model_path):
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(
+            f"Emotion model not found at {model_path}; create it with "
+            "`python -m neurasync.classifiers export` or set NEURASYNC_EMOTION_MODEL")
+
+
+class OnnxClassifier:
+    """Exported emotion model on ONNX Runtime's CPU provider"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path=EMOTION_MODEL, int8=EMOTION_MODEL_INT8, threads=INTRA_OP_THREADS):
+        import onnxruntime as ort
+
+        _require_model(model_path)
+        if int8:
+            quantized = model_path.replace('.onnx', '.int8.onnx')
+            model_path = quantized if os.path.exists(quantized) else quantize_model(model_path, quantized)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        # Exports keep Keras' NHWC layout, but accept NCHW models too
+        self._channels_first = len(model_input.shape) == 4 and model_input.shape[1] == 1
+
+    def predict(self, batch):
+        if self._channels_first:
+            batch = np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+        return np.asarray(self._session.run(None, {self._input_name: batch})[0], dtype=np.float32)
+
+
+class OpenCVDnnClassifier:
+    """Exported emotion model on OpenCV's DNN module"""
+
+    name = 'opencv-dnn'
+
+    def __init__(self, model_path=EMOTION_MODEL, threads=INTRA_OP_THREADS):
+        _require_model(model_path)
+        if threads:
+            cv2.setNumThreads(threads)
+        self._net = cv2.dnn.readNetFromONNX(model_path)
+
+    def predict(self, batch):
+        self._net.setInput(batch)
+        return np.asarray(self._net.forward(), dtype=np.float32)
+
+
+CLASSIFIERS = {
+    'deepface': DeepFaceClassifier,
+    'onnx': OnnxClassifier,
+    'opencv-dnn': OpenCVDnnClassifier,
+}
+
+
+def create_classifier(name):
+    """Build an emotion classifier by name: deepface, onnx or opencv-dnn"""
+    if name not in CLASSIFIERS:
+        raise ValueError(f"Unknown emotion engine: {name}")
+    return CLASSIFIERS[name]()
+
+
+def export_onnx(output_path, int8=False):
+    """Export DeepFace's Keras emotion model to ONNX (requires tf2onnx)"""
+    import tensorflow as tf
+    import tf2onnx
+
+    model = build_deepface_model()
+    spec = (tf.TensorSpec((None,) + FACE_INPUT_SIZE + (1,), tf.float32, name='face'),)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=13, output_path=output_path)
+    print(f"Exported emotion model to {output_path}")
+    if int8:
+        print(f"Quantized copy written to {quantize_model(output_path)}")
+
+
+def parity_report(faces, engine, reference='deepface', repeats=3):
+    """Compare an engine's predictions and latency with the reference engine on face crops"""
+    batch = preprocess_faces(faces)
+    report = {}
+    predictions = {}
+    for name in (reference, engine):
+        classifier = create_classifier(name)
+        classifier.predict(batch[:1])
+        timings = []
+        for _ in range(repeats):
+            for i in range(len(batch)):
+                start = time.perf_counter()
+                classifier.predict(batch[i:i + 1])
+                timings.append((time.perf_counter() - start) * 1000.0)
+        predictions[name] = classifier.predict(batch)
+        report[name] = {
+            'p50Ms': round(float(np.percentile(timings, 50)), 3),
+            'p95Ms': round(float(np.percentile(timings, 95)), 3)
+        }
+
+    expected, actual = predictions[reference], predictions[engine]
+    report['top1Agreement'] = float(np.mean(expected.argmax(axis=1) == actual.argmax(axis=1)))
+    report['maxAbsError'] = float(np.abs(expected - actual).max())
+    report['meanAbsError'] = float(np.abs(expected - actual).mean())
+    return report
+
+
+def _load_faces(directory, detector='haar'):
+    from neurasync.detectors import create_detector
+
+    detect = create_detector(detector)
+    faces = []
+    for name in sorted(os.listdir(directory)):
+        img = cv2.imread(os.path.join(directory, name), cv2.IMREAD_COLOR)
+        if img is None:
+            continue
+        boxes = detect.detect(img)
+        if boxes:
+            x, y, w, h = boxes[0]
+            img = img[y:y + h, x:x + w]
+        faces.append(img)
+    return faces
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and validate emotion classifier engines")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help="convert the DeepFace model to ONNX")
+    export.add_argument('output', nargs='?', default=EMOTION_MODEL)
+    export.add_argument('--int8', action='store_true', help="also write an int8-quantized copy")
+
+    parity = commands.add_parser('parity', help="compare an engine against DeepFace")
+    parity.add_argument('images', help="directory of sample face images")
+    parity.add_argument('--engine', default='onnx', choices=sorted(CLASSIFIERS))
+    parity.add_argument('--min-agreement', type=float, default=0.95)
+    parity.add_argument('--repeats', type=int, default=3)
+
+    args = parser.parse_args(argv)
+    if args.command == 'export':
+        export_onnx(args.output, args.int8)
+        return 0
+
+    faces = _load_faces(args.images)
+    if not faces:
+        parser.error(f"No readable images in {args.images}")
+    report = parity_report(faces, args.engine, repeats=args.repeats)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    if report['top1Agreement'] < args.min_agreement:
+        print(f"FAIL: top-1 agreement below {args.min_agreement}")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
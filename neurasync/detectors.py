@@ -0,0 +1,173 @@
+"""
+Selectable face detectors for the emotion engine.
+
+haar    OpenCV Haar cascade (the detector DeepFace's opencv backend uses)
+yunet   OpenCV DNN YuNet model; needs the ONNX file at NEURASYNC_YUNET_MODEL
+skip    no detection, for inputs that are already face crops
+
+Detection runs on a copy downscaled so its longer side is at most max_side
+pixels, and boxes are mapped back to full-frame coordinates.
+
+    python -m neurasync.detectors IMAGE_DIR [--detectors haar,yunet] [--repeats 5]
+
+prints a per-backend latency benchmark over a directory of images.
+"""
+
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+YUNET_MODEL = os.environ.get('NEURASYNC_YUNET_MODEL', 'models/face_detection_yunet_2023mar.onnx')
+
+
+def _downscale(img, max_side):
+    """Return (resized image, scale factor) with the longer side at most max_side"""
+    height, width = img.shape[:2]
+    scale = min(1.0, max_side / float(max(height, width))) if max_side else 1.0
+    if scale >= 1.0:
+        return img, 1.0
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA), scale
+
+
+def _to_full_frame(boxes, scale, shape):
+    """Map (x, y, w, h) boxes from the downscaled copy back to the frame, largest first"""
+    height, width = shape[:2]
+    mapped = []
+    for x, y, w, h in boxes:
+        x0, y0 = max(0, int(x / scale)), max(0, int(y / scale))
+        x1, y1 = min(width, int((x + w) / scale)), min(height, int((y + h) / scale))
+        if x1 > x0 and y1 > y0:
+            mapped.append((x0, y0, x1 - x0, y1 - y0))
+    return sorted(mapped, key=lambda box: box[2] * box[3], reverse=True)
+
+
+class HaarDetector:
+    """OpenCV Haar cascade on a downscaled grayscale copy"""
+
+    name = 'haar'
+
+    def __init__(self, max_side=320, min_neighbors=10):
+        self.max_side = max_side
+        self.min_neighbors = min_neighbors
+        self._cascade = cv2.CascadeClassifier(
+            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    def detect(self, img):
+        small, scale = _downscale(img, self.max_side)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        boxes = self._cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=self.min_neighbors)
+        return _to_full_frame(boxes, scale, img.shape)
+
+
+class YuNetDetector:
+    """OpenCV DNN YuNet face detector on a downscaled copy"""
+
+    name = 'yunet'
+
+    def __init__(self, max_side=320, model_path=YUNET_MODEL, score_threshold=0.7):
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"YuNet model not found at {model_path}; download face_detection_yunet_2023mar.onnx "
+                "from the OpenCV model zoo and set NEURASYNC_YUNET_MODEL")
+        self.max_side = max_side
+        self._model = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold)
+        self._input_size = None
+
+    def detect(self, img):
+        small, scale = _downscale(img, self.max_side)
+        size = (small.shape[1], small.shape[0])
+        if size != self._input_size:
+            self._model.setInputSize(size)
+            self._input_size = size
+        _, faces = self._model.detect(small)
+        if faces is None:
+            return []
+        return _to_full_frame(faces[:, :4], scale, img.shape)
+
+
+class SkipDetector:
+    """No detection: the whole frame is treated as the face"""
+
+    name = 'skip'
+
+    def __init__(self, max_side=None):
+        pass
+
+    def detect(self, img):
+        return []
+
+
+DETECTORS = {
+    'haar': HaarDetector,
+    'yunet': YuNetDetector,
+    'skip': SkipDetector,
+}
+
+
+def create_detector(name, max_side=320):
+    """Build a face detector by name: haar, yunet or skip"""
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown face detector: {name}")
+    return DETECTORS[name](max_side=max_side)
+
+
+def benchmark_detectors(images, names=('haar', 'yunet'), max_side=320, repeats=5):
+    """Return per-detector latency percentiles (ms) and face counts over a list of BGR frames"""
+    report = {}
+    for name in names:
+        try:
+            detector = create_detector(name, max_side=max_side)
+        except (FileNotFoundError, AttributeError) as e:
+            report[name] = {'error': str(e)}
+            continue
+        detector.detect(images[0])  # first call pays lazy initialization
+        timings = []
+        faces = 0
+        for _ in range(repeats):
+            for img in images:
+                start = time.perf_counter()
+                boxes = detector.detect(img)
+                timings.append((time.perf_counter() - start) * 1000.0)
+                faces += len(boxes)
+        p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+        report[name] = {
+            'p50Ms': round(float(p50), 3),
+            'p95Ms': round(float(p95), 3),
+            'p99Ms': round(float(p99), 3),
+            'meanMs': round(float(np.mean(timings)), 3),
+            'facesPerImage': round(faces / float(repeats * len(images)), 3)
+        }
+    return report
+
+
+def _load_images(directory):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        img = cv2.imread(os.path.join(directory, name), cv2.IMREAD_COLOR)
+        if img is not None:
+            images.append(img)
+    return images
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark face detector backends")
+    parser.add_argument('images', help="directory of sample images")
+    parser.add_argument('--detectors', default='haar,yunet,skip')
+    parser.add_argument('--max-side', type=int, default=320)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    images = _load_images(args.images)
+    if not images:
+        parser.error(f"No readable images in {args.images}")
+    report = benchmark_detectors(images, args.detectors.split(','), args.max_side, args.repeats)
+    for name, stats in report.items():
+        print(f"{name:>6}: {stats}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,494 @@
+"""
+Local facial emotion analysis shared by the Streamlit app and the API server.
+
+The face detector and the DeepFace emotion model are loaded once per process
+by a single EmotionEngine, so requests never pay the import and weight load.
+"""
+
+import base64
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from neurasync.backends import create_backend
+from neurasync.batching import MicroBatcher
+from neurasync.cache import LRUCache, image_key, perceptual_key
+from neurasync.classifiers import create_classifier, preprocess_faces
+from neurasync.detectors import create_detector
+from neurasync.labels import EMOTION_LABELS, STRESS_WEIGHTS, scores_array
+from neurasync.metrics import count, timed
+
+DEFAULT_RESULT = {
+    "stressLevel": 30,
+    "primaryEmotion": {"name": "neutral", "confidence": 50},
+    "secondaryEmotion": {"name": "calm", "confidence": 30},
+    "insight": "Unable to detect emotion clearly. Using neutral as default."
+}
+
+# Emotion classifier engine: deepface, onnx or opencv-dnn
+EMOTION_ENGINE = os.environ.get('NEURASYNC_EMOTION_ENGINE', 'deepface')
+
+# Face detector backend (haar, yunet or skip) and the longest side of the
+# downscaled copy it runs on (0 keeps full resolution)
+DETECTOR = os.environ.get('NEURASYNC_DETECTOR', 'haar')
+DETECT_MAX_SIDE = int(os.environ.get('NEURASYNC_DETECT_MAX_SIDE', '320'))
+
+# Default cap on faces analyzed per frame in multi-face mode
+MAX_FACES = int(os.environ.get('NEURASYNC_MAX_FACES', '10'))
+
+# Upper bound on images accepted by one detect_emotions_batch call
+MAX_BATCH_SIZE = 64
+
+# Micro-batching window for concurrent single-image API requests
+BATCH_WINDOW_MS = float(os.environ.get('NEURASYNC_BATCH_WINDOW_MS', '10'))
+BATCH_MAX_SIZE = int(os.environ.get('NEURASYNC_BATCH_MAX_SIZE', '16'))
+
+# Seconds a request waits for its micro-batched result before giving up
+BATCH_TIMEOUT = float(os.environ.get('NEURASYNC_BATCH_TIMEOUT', '30'))
+
+# Execution backend (inline, thread or process) and its pool size
+BACKEND = os.environ.get('NEURASYNC_BACKEND', 'inline')
+BACKEND_WORKERS = int(os.environ.get('NEURASYNC_BACKEND_WORKERS', '0')) or None
+
+# Result cache shared by every session in the process; CACHE_KEY is
+# "exact" (content hash) or "perceptual" (difference hash)
+CACHE_SIZE = int(os.environ.get('NEURASYNC_CACHE_SIZE', '1024'))
+CACHE_TTL = float(os.environ.get('NEURASYNC_CACHE_TTL', '300')) or None
+CACHE_KEY = os.environ.get('NEURASYNC_CACHE_KEY', 'exact')
+
+# cv2.imdecode releases the GIL, so batch decoding runs on a small pool
+_decode_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='emotion-decode')
+
+
+def default_result():
+    """Return a fresh copy of the neutral fallback result"""
+    return {key: dict(value) if isinstance(value, dict) else value
+            for key, value in DEFAULT_RESULT.items()}
+
+
+def decode_base64(img_base64):
+    """Decode a base64 (optionally data-URL) string to the encoded image bytes"""
+    with timed('base64_decode'):
+        return base64.b64decode(img_base64.split(',')[1] if ',' in img_base64 else img_base64)
+
+
+def decode_image(img_base64):
+    """Decode a base64 (optionally data-URL) JPEG/PNG string to a BGR array"""
+    return decode_bytes(decode_base64(img_base64))
+
+
+def decode_bytes(img_data):
+    """Decode encoded JPEG/PNG bytes to a BGR array without copying the buffer"""
+    nparr = np.frombuffer(img_data, np.uint8)
+    with timed('imdecode'):
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+    if img is None:
+        raise ValueError("Failed to decode image")
+    return img
+
+
+def image_to_base64(image):
+    """Convert a PIL image to a base64 JPEG string"""
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG")
+    return base64.b64encode(buffered.getvalue()).decode()
+
+
+def load_image(image):
+    """
+    Return a BGR uint8 array for any supported input.
+
+    Accepts a base64 string, encoded image bytes, a NumPy array (BGR, BGRA
+    or grayscale) or a PIL image, so callers never re-encode a frame they
+    already hold. Float arrays with values in [0, 1] are scaled to 0-255;
+    other non-uint8 arrays are taken as 0-255 and clipped.
+    """
+    if isinstance(image, str):
+        return decode_image(image)
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return decode_bytes(image)
+    if isinstance(image, np.ndarray):
+        if image.dtype != np.uint8:
+            if image.dtype.kind == 'f' and image.size and image.max() <= 1.0:
+                image = image * 255.0
+            image = np.clip(np.rint(image), 0, 255).astype(np.uint8)
+        if image.ndim == 2:
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        if image.shape[2] == 4:
+            return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        return image
+    if hasattr(image, 'convert'):
+        # PIL images are RGB; flip channels as a view rather than converting
+        rgb = np.asarray(image if image.mode == 'RGB' else image.convert('RGB'))
+        return rgb[:, :, ::-1]
+    raise TypeError(f"Unsupported image type: {type(image).__name__}")
+
+
+def build_results(scores):
+    """Build one result dict (neurasync.results shape) per row of an (N, 7) score array in EMOTION_LABELS order"""
+    scores = np.asarray(scores, dtype=np.float32)
+    if scores.ndim == 1:
+        scores = scores[None, :]
+    if len(scores) == 0:
+        return []
+    with timed('postprocess'):
+        return _build_results(scores)
+
+
+def _build_results(scores):
+    # Top-2 per row without a full sort, then order the pair
+    top2 = np.argpartition(scores, -2, axis=1)[:, -2:]
+    rows = np.arange(len(scores))[:, None]
+    order = np.argsort(-scores[rows, top2], axis=1)
+    top2 = top2[rows, order]
+    top2_scores = scores[rows, top2]
+    stress = STRESS_WEIGHTS[top2[:, 0]].astype(int)
+    rounded = np.round(scores.astype(np.float64), 2)
+    confidences = np.round(top2_scores).astype(int)
+
+    results = []
+    for i in range(len(scores)):
+        dominant_emotion = EMOTION_LABELS[top2[i, 0]]
+        confidence = int(confidences[i, 0])
+        stress_level = int(stress[i])
+        results.append({
+            "stressLevel": stress_level,
+            "primaryEmotion": {
+                "name": dominant_emotion,
+                "confidence": confidence
+            },
+            "secondaryEmotion": {
+                "name": EMOTION_LABELS[top2[i, 1]],
+                "confidence": int(confidences[i, 1])
+            },
+            "insight": f"Your primary emotion appears to be {dominant_emotion} with {confidence}% confidence. This suggests a {stress_level}% stress level.",
+            "emotions": dict(zip(EMOTION_LABELS, rounded[i].tolist()))
+        })
+    return results
+
+
+def build_result(scores):
+    """Build the API result dict from a score vector or a {emotion: score} mapping"""
+    if isinstance(scores, dict):
+        scores = scores_array(scores)
+    return build_results(scores)[0]
+
+
+class EmotionEngine:
+    """Process-wide holder of the face detector and emotion model"""
+
+    def __init__(self, detector=None, detect_max_side=None, classifier=None):
+        self.detector_name = detector or DETECTOR
+        self.classifier_name = classifier or EMOTION_ENGINE
+        self.detect_max_side = DETECT_MAX_SIDE if detect_max_side is None else detect_max_side
+        self._lock = threading.Lock()
+        self._detector = None
+        self._model = None
+        self.ready = False
+        self.load_seconds = None
+        self.warmup_seconds = None
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def load(self):
+        """Load the detector and emotion model, once"""
+        if self._model is not None:
+            return
+        with self._lock:
+            if self._model is not None:
+                return
+            start = time.perf_counter()
+            self._detector = create_detector(self.detector_name, self.detect_max_side)
+            self._model = create_classifier(self.classifier_name)
+            self.load_seconds = time.perf_counter() - start
+
+    def warmup(self):
+        """Run a dummy frame through the whole pipeline so the first request is fast"""
+        self.load()
+        start = time.perf_counter()
+        dummy = np.full((240, 320, 3), 127, dtype=np.uint8)
+        self.analyze(dummy)
+        self.warmup_seconds = time.perf_counter() - start
+        self.ready = True
+
+    def _detect(self, img):
+        self.load()
+        with timed('face_detection'):
+            return self._detector.detect(img)
+
+    def detect_face_box(self, img):
+        """Return the (x, y, w, h) box of the largest face in a BGR frame, or None"""
+        boxes = self._detect(img)
+        return boxes[0] if boxes else None
+
+    def detect_face_boxes(self, img, max_faces=None):
+        """
+        Return face boxes in a BGR frame, largest first, at most max_faces
+
+        With the skip detector the input is taken to be a face crop, so the
+        whole frame is returned as the one face.
+        """
+        if self.detector_name == 'skip':
+            return [(0, 0, img.shape[1], img.shape[0])]
+        boxes = self._detect(img)
+        return boxes[:max_faces] if max_faces else boxes
+
+    def detect_face(self, img):
+        """Return the largest face crop in a BGR frame, or the full frame if none is found"""
+        box = self.detect_face_box(img)
+        if box is None:
+            return img
+        x, y, w, h = box
+        return img[y:y + h, x:x + w]
+
+    def classify(self, faces):
+        """Return an (N, 7) array of emotion percentages for a list of BGR face crops"""
+        self.load()
+        with timed('emotion_inference'):
+            scores = self._model.predict(preprocess_faces(faces))
+        return 100.0 * scores / scores.sum(axis=1, keepdims=True)
+
+    def analyze(self, img):
+        """Return the score vector (EMOTION_LABELS order) for the main face in a BGR frame"""
+        return self.analyze_batch([img])[0]
+
+    def analyze_batch(self, imgs):
+        """Return an (N, 7) score array, one row per frame, classifying all faces in one model call"""
+        self.load()
+        if not imgs:
+            return np.empty((0, len(EMOTION_LABELS)), dtype=np.float32)
+        return self.classify([self.detect_face(img) for img in imgs])
+
+    def analyze_faces_batch(self, imgs, max_faces=None):
+        """
+        Return, per frame, a list of (box, scores) for every detected face
+
+        One detection pass per frame; the crops of all faces in all frames
+        are classified in a single model call.
+        """
+        self.load()
+        boxes = [self.detect_face_boxes(img, max_faces) for img in imgs]
+        crops = [img[y:y + h, x:x + w] for img, frame_boxes in zip(imgs, boxes)
+                 for x, y, w, h in frame_boxes]
+        scores = self.classify(crops) if crops else np.empty((0, len(EMOTION_LABELS)), dtype=np.float32)
+
+        faces, offset = [], 0
+        for frame_boxes in boxes:
+            faces.append(list(zip(frame_boxes, scores[offset:offset + len(frame_boxes)])))
+            offset += len(frame_boxes)
+        return faces
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Return the process-wide EmotionEngine"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = EmotionEngine()
+    return _engine
+
+
+_backend = None
+_batcher = None
+
+
+def get_backend():
+    """Return the process-wide execution backend selected by NEURASYNC_BACKEND"""
+    global _backend
+    if _backend is None:
+        engine = get_engine()
+        with _engine_lock:
+            if _backend is None:
+                _backend = create_backend(BACKEND, engine, BACKEND_WORKERS)
+    return _backend
+
+
+def get_batcher():
+    """Return the process-wide MicroBatcher in front of the shared engine"""
+    global _batcher
+    if _batcher is None:
+        backend = get_backend()
+        with _engine_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(backend.analyze_batch,
+                                        max_batch_size=BATCH_MAX_SIZE,
+                                        max_wait_ms=BATCH_WINDOW_MS,
+                                        name='emotion-batcher')
+    return _batcher
+
+
+_result_cache = LRUCache(CACHE_SIZE, CACHE_TTL)
+
+
+def get_result_cache():
+    """Return the process-wide emotion result cache"""
+    return _result_cache
+
+
+def _cache_key(img):
+    return perceptual_key(img) if CACHE_KEY == 'perceptual' else image_key(img)
+
+
+def analyze_images(imgs, analyze_batch=None):
+    """
+    Return an (N, 7) score array for decoded frames, serving repeats from the cache
+
+    Only cache misses reach analyze_batch (the shared backend by default).
+    """
+    analyze_batch = analyze_batch or get_backend().analyze_batch
+    if CACHE_SIZE <= 0:
+        return np.asarray(analyze_batch(imgs), dtype=np.float32)
+
+    scores = np.empty((len(imgs), len(EMOTION_LABELS)), dtype=np.float32)
+    keys = [_cache_key(img) for img in imgs]
+    misses = []
+    for i, key in enumerate(keys):
+        cached = _result_cache.get(key)
+        if cached is None:
+            misses.append(i)
+        else:
+            scores[i] = cached
+    if misses:
+        fresh = np.asarray(analyze_batch([imgs[i] for i in misses]), dtype=np.float32)
+        scores[misses] = fresh
+        for i, row in zip(misses, fresh):
+            _result_cache.set(keys[i], row)
+    return scores
+
+
+_warm_thread = None
+
+
+def start_engine(background=True):
+    """Load and warm the shared backend, in a daemon thread unless background is False"""
+    global _warm_thread
+    backend = get_backend()
+    if backend.ready:
+        return backend
+
+    def _warm():
+        try:
+            backend.warmup()
+        except Exception as e:
+            print(f"Error warming up emotion engine: {str(e)}")
+
+    if background:
+        with _engine_lock:
+            if _warm_thread is None:
+                _warm_thread = threading.Thread(target=_warm, daemon=True)
+                _warm_thread.start()
+    else:
+        _warm()
+    return backend
+
+
+def analyze_emotion(image, batched=False):
+    """
+    Return the result dict for one image, raising if it cannot be analyzed
+
+    With batched, the model call goes through the shared micro-batcher.
+    """
+    img = load_image(image)
+    if batched:
+        scores = analyze_images([img], lambda imgs: [get_batcher()(imgs[0], timeout=BATCH_TIMEOUT)])[0]
+    else:
+        scores = analyze_images([img])[0]
+    return build_result(scores)
+
+
+def detect_emotion(image):
+    """
+    Detect emotion using OpenCV and deepface
+
+    image may be a base64 string, encoded bytes, a BGR array or a PIL image.
+    """
+    try:
+        return analyze_emotion(image)
+    except Exception as e:
+        print(f"Error in emotion detection: {str(e)}")
+        count('default_result')
+        return default_result()
+
+
+def _try_decode(image):
+    try:
+        return load_image(image)
+    except Exception as e:
+        print(f"Error decoding image: {str(e)}")
+        return None
+
+
+def detect_emotions_batch(images):
+    """
+    Detect emotion for a list of images in one model pass.
+
+    Each item may be any input accepted by load_image.
+
+    Results come back in input order; images that fail to decode or
+    analyze get the neutral default result.
+    """
+    if len(images) > MAX_BATCH_SIZE:
+        raise ValueError(f"Batch of {len(images)} images exceeds the limit of {MAX_BATCH_SIZE}")
+
+    decoded = list(_decode_pool.map(_try_decode, images))
+    valid = [i for i, img in enumerate(decoded) if img is not None]
+    results = [default_result() for _ in images]
+
+    try:
+        scores = analyze_images([decoded[i] for i in valid])
+        for i, result in zip(valid, build_results(scores)):
+            results[i] = result
+    except Exception as e:
+        print(f"Error in batch emotion detection: {str(e)}")
+        valid = []
+    count('default_result', len(images) - len(valid))
+    return results
+
+
+def detect_emotion_batched(image):
+    """
+    Detect emotion through the shared micro-batcher.
+
+    Same contract as detect_emotion, but concurrent callers share one
+    batched model call instead of competing for the CPU.
+    """
+    try:
+        return analyze_emotion(image, batched=True)
+    except Exception as e:
+        print(f"Error in emotion detection: {str(e)}")
+        count('default_result')
+        return default_result()
+
+
+def detect_faces(image, max_faces=None):
+    """
+    Detect every face in a frame and return per-face emotion results
+
+    Returns {"faceCount": n, "faces": [...]} where each face carries the usual
+    result fields plus its "faceBox" [x, y, w, h], largest face first. At most
+    max_faces faces (NEURASYNC_MAX_FACES by default) are classified.
+    """
+    try:
+        img = load_image(image)
+        faces = get_backend().analyze_faces_batch([img], max_faces or MAX_FACES)[0]
+    except Exception as e:
+        print(f"Error in multi-face emotion detection: {str(e)}")
+        return {"faceCount": 0, "faces": []}
+
+    results = build_results(np.array([scores for _, scores in faces])) if faces else []
+    for (box, _), result in zip(faces, results):
+        result["faceBox"] = [int(v) for v in box]
+    return {"faceCount": len(results), "faces": results}
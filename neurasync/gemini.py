@@ -0,0 +1,354 @@
+"""
+Gemini chat for Manassu, the therapeutic companion, and Gemini emotion analysis.
+
+Shared by the Streamlit chat and the API server's streaming endpoint.
+Emotion analyses and opening chat turns are cached by model, normalized
+prompt and image hash, and concurrent identical requests share one call.
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import google.generativeai as genai
+
+from neurasync.cache import ResponseCache, request_key
+from neurasync.labels import EMOTION_LABELS
+from neurasync.memory import ConversationMemory, summary_prompt
+from neurasync.metrics import count, stage_seconds, timed
+from neurasync.results import RESULT_SCHEMA, validate_result
+
+MODEL_NAME = 'gemini-1.5-pro'
+
+# Cheaper model used to fold old turns into the conversation summary
+SUMMARY_MODEL_NAME = 'gemini-1.5-flash'
+
+# Per-turn history budget and verbatim window of the conversation memory
+CHAT_TOKEN_BUDGET = int(os.environ.get('NEURASYNC_CHAT_TOKEN_BUDGET', '3000'))
+CHAT_KEEP_TURNS = int(os.environ.get('NEURASYNC_CHAT_KEEP_TURNS', '4'))
+
+# Seconds a turn waits for the previous turn of the same chat to finish
+TURN_TIMEOUT = 60
+
+# Response cache for repeatable Gemini requests; NEURASYNC_GEMINI_CACHE_DIR adds a disk tier
+GEMINI_CACHE_SIZE = int(os.environ.get('NEURASYNC_GEMINI_CACHE_SIZE', '512'))
+GEMINI_CACHE_TTL = float(os.environ.get('NEURASYNC_GEMINI_CACHE_TTL', '3600'))
+GEMINI_CACHE_DIR = os.environ.get('NEURASYNC_GEMINI_CACHE_DIR')
+
+# System prompt for the therapeutic assistant
+THERAPEUTIC_PROMPT = """
+You are a supportive and empathetic therapeutic assistant called "Manassu" for Neurasync, a mental wellness platform.
+
+Please respond to all queries with a warm, compassionate tone that encourages growth and self-reflection.
+Use a conversational style that feels personal and caring.
+
+Your responses should:
+- Be supportive and non-judgmental
+- Offer gentle encouragement and motivation
+- Use empowering language that builds confidence
+- Ask thoughtful questions that promote self-reflection when appropriate
+- Acknowledge emotions and validate feelings
+- Provide practical coping strategies when relevant
+- Use a warm, conversational tone as if speaking to a friend
+
+Keep responses concise (under 150 words) but warm and helpful.
+Include 2-4 practical suggestions when appropriate.
+Never claim to be a licensed therapist or provide medical advice.
+
+Format your response with a main message and then 2-4 suggestions as bullet points if appropriate.
+
+Remember to maintain boundaries by not diagnosing conditions or replacing professional mental health care.
+"""
+
+EMOTION_PROMPT = f"""
+Analyze this facial image and detect the emotional state.
+
+Give the primary and secondary emotion, each one of: {", ".join(EMOTION_LABELS)},
+with a confidence from 0 to 100, a stress level from 0 to 100, and a brief
+insight about the emotional state.
+"""
+
+# Sent once, text only, when a reply does not parse or validate
+REPAIR_PROMPT = """
+This reply to an emotion analysis request is not valid: {error}
+
+Reply:
+{reply}
+
+Return the corrected analysis as JSON matching the schema.
+"""
+
+# Structured output: Gemini returns JSON constrained to the shared result schema
+EMOTION_GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": RESULT_SCHEMA
+}
+
+
+_models = {}
+_models_lock = threading.Lock()
+_configured = False
+
+response_cache = ResponseCache(
+    GEMINI_CACHE_SIZE, GEMINI_CACHE_TTL or None,
+    os.path.join(GEMINI_CACHE_DIR, 'gemini.sqlite3') if GEMINI_CACHE_DIR else None)
+
+
+def configure(api_key):
+    """Configure Gemini with an API key and drop models bound to a previous key"""
+    global _configured
+    genai.configure(api_key=api_key)
+    with _models_lock:
+        _models.clear()
+    _configured = True
+
+
+def is_configured():
+    return _configured
+
+
+def configure_from_env():
+    """Configure Gemini from GEMINI_API_KEY; return whether a key was found"""
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if api_key:
+        configure(api_key)
+    return bool(api_key)
+
+
+def get_model(model_name=MODEL_NAME, system_instruction=None):
+    """Return the process-wide GenerativeModel for a model and system instruction, created once"""
+    key = (model_name, system_instruction)
+    model = _models.get(key)
+    if model is None:
+        with _models_lock:
+            model = _models.get(key)
+            if model is None:
+                model = _models[key] = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+    return model
+
+
+def summarize_with_gemini(summary, messages):
+    """Fold messages into the running conversation summary with the summary model"""
+    return get_model(SUMMARY_MODEL_NAME).generate_content(summary_prompt(summary, messages)).text.strip()
+
+
+# Summaries run off the request path, one at a time
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-summary')
+
+
+def parse_emotion_reply(text):
+    """Parse and validate a Gemini emotion reply, raising ValueError if unusable"""
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # Tolerate JSON wrapped in markdown rather than paying for a repair call
+        data = json.loads(text[text.find('{'):text.rfind('}') + 1])
+    return validate_result(data)
+
+
+def request_emotion_analysis(image, model_name=MODEL_NAME, timeout=None):
+    """
+    Analyze emotion in a JPEG (bytes, base64 or data URL) with Gemini, raising on failure
+
+    The reply is schema-constrained JSON, validated into the shared result
+    shape with 0-100 confidences. An invalid reply gets one text-only repair
+    request before ValueError is raised. Results are cached by model and image
+    hash; concurrent requests for the same image share one call. timeout
+    (seconds) bounds both requests together, so no HTTP call outlives it.
+    """
+    data = base64.b64decode(image.split(',')[-1]) if isinstance(image, str) else bytes(image)
+    deadline = time.monotonic() + timeout if timeout else None
+
+    def generate(model, contents):
+        request_options = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Gemini emotion analysis deadline exceeded")
+            request_options = {"timeout": remaining}
+        with timed('gemini_analysis'):
+            return model.generate_content(contents, generation_config=EMOTION_GENERATION_CONFIG,
+                                          request_options=request_options).text
+
+    def analyze():
+        model = get_model(model_name)
+        reply = generate(model, [
+            EMOTION_PROMPT,
+            {"mime_type": "image/jpeg", "data": data}
+        ])
+        try:
+            return parse_emotion_reply(reply)
+        except ValueError as e:
+            count('gemini_repair')
+            return parse_emotion_reply(generate(model, REPAIR_PROMPT.format(error=str(e), reply=reply[:2000])))
+
+    return response_cache.get_or_compute(request_key(model_name, EMOTION_PROMPT, data), analyze)
+
+
+def analyze_emotion_with_gemini(image, model_name=MODEL_NAME):
+    """Analyze emotion using Gemini directly if backend is unavailable"""
+    if not _configured:
+        return {
+            "primaryEmotion": {"name": "unknown", "confidence": 0},
+            "secondaryEmotion": {"name": "unknown", "confidence": 0},
+            "stressLevel": 50,
+            "insight": "Please configure the Gemini API key to enable emotion detection."
+        }
+
+    try:
+        return request_emotion_analysis(image, model_name)
+    except ValueError:
+        # The reply was unusable even after the repair request
+        count('default_result')
+        return {
+            "primaryEmotion": {"name": "neutral", "confidence": 50},
+            "secondaryEmotion": {"name": "unknown", "confidence": 10},
+            "stressLevel": 30,
+            "insight": "Unable to properly analyze the image."
+        }
+    except Exception as e:
+        print(f"Error analyzing emotion with Gemini: {str(e)}")
+        return {
+            "primaryEmotion": {"name": "error", "confidence": 0},
+            "secondaryEmotion": {"name": "error", "confidence": 0},
+            "stressLevel": 50,
+            "insight": f"Error during analysis: {str(e)}"
+        }
+
+
+def format_chat_history(messages):
+    """Format chat history for Gemini API"""
+    formatted_history = []
+
+    for message in messages:
+        role = "user" if message["role"] == "user" else "model"
+        formatted_history.append({
+            "role": role,
+            "parts": [message["content"]]
+        })
+
+    return formatted_history
+
+
+class ManassuChat:
+    """
+    One persistent Gemini chat per user session
+
+    The therapeutic prompt is the model's system instruction. Turns are
+    appended to the underlying chat; once the history outgrows its token
+    budget, older turns are summarized in the background and the chat is
+    re-seeded from the compacted memory at the start of the next turn.
+
+    An opening message (no earlier history) is answered from the response
+    cache when the same message was asked before.
+    """
+
+    def __init__(self, history=None, model_name=MODEL_NAME, token_budget=None, keep_turns=None):
+        self.model_name = model_name
+        self.memory = ConversationMemory.from_history(
+            history or [],
+            token_budget=token_budget or CHAT_TOKEN_BUDGET,
+            keep_turns=keep_turns or CHAT_KEEP_TURNS,
+            summarize=summarize_with_gemini)
+        self._model = get_model(model_name, system_instruction=THERAPEUTIC_PROMPT)
+        self._lock = threading.Lock()
+        self._compaction = None
+        self._synced_version = -1
+        self._sync()
+
+    def _sync(self):
+        """Re-seed the chat from memory if a compaction finished since the last turn"""
+        if self.memory.version != self._synced_version:
+            self._chat = self._model.start_chat(history=self.memory.history())
+            self._synced_version = self.memory.version
+
+    def _opening_key(self, prompt):
+        """Cache key for a first turn; None once the chat has history"""
+        if self.memory.history():
+            return None
+        return request_key(self.model_name, prompt, context=THERAPEUTIC_PROMPT)
+
+    def _record(self, prompt, reply, cached=False):
+        self.memory.add("user", prompt)
+        self.memory.add("model", reply)
+        if cached:
+            # The reply did not go through this chat; re-seed it from memory next turn
+            self._synced_version = -1
+        pending = self._compaction is not None and not self._compaction.done()
+        if not pending and self.memory.needs_compaction():
+            self._compaction = _summary_pool.submit(self.memory.compact)
+
+    def _send(self, prompt, sent):
+        with timed('gemini_chat'):
+            reply = self._chat.send_message(prompt).text
+        sent.append(True)
+        return reply
+
+    def send(self, prompt):
+        """Get response from Gemini model with therapeutic tone"""
+        if not self._lock.acquire(timeout=TURN_TIMEOUT):
+            return "Error: the previous message is still being answered"
+        try:
+            self._sync()
+            key = self._opening_key(prompt)
+            sent = []
+            if key is None:
+                reply = self._send(prompt, sent)
+            else:
+                reply = response_cache.get_or_compute(key, lambda: self._send(prompt, sent))
+            # Only a reply served from the cache bypassed this chat
+            self._record(prompt, reply, cached=not sent)
+            return reply
+        except Exception as e:
+            return f"Error: {str(e)}"
+        finally:
+            self._lock.release()
+
+    def stream(self, prompt):
+        """Yield the reply in text chunks as they are generated"""
+        if not self._lock.acquire(timeout=TURN_TIMEOUT):
+            yield "Error: the previous message is still being answered"
+            return
+        try:
+            self._sync()
+            key = self._opening_key(prompt)
+            cached = response_cache.get(key) if key is not None else None
+            if cached is not None:
+                self._record(prompt, cached, cached=True)
+                yield cached
+                return
+            chunks = []
+            start = time.perf_counter()
+            for chunk in self._chat.send_message(prompt, stream=True):
+                # Safety-filtered or empty chunks carry no text
+                if chunk.candidates and chunk.candidates[0].content.parts:
+                    if not chunks:
+                        stage_seconds.observe('gemini_first_token', time.perf_counter() - start)
+                    chunks.append(chunk.text)
+                    yield chunk.text
+            # Includes the time the consumer spent between chunks
+            stage_seconds.observe('gemini_chat', time.perf_counter() - start)
+            reply = "".join(chunks)
+            self._record(prompt, reply)
+            if key is not None and reply:
+                response_cache.set(key, reply)
+        except Exception as e:
+            # Memory never recorded the failed turn; re-seed the chat from it next
+            # turn instead of rewinding, which raises when no candidate arrived
+            self._synced_version = -1
+            yield f"Error: {str(e)}"
+        finally:
+            self._lock.release()
+
+
+def get_gemini_response(prompt, chat_history):
+    """Get response from Gemini model with therapeutic tone"""
+    return ManassuChat(chat_history).send(prompt)
+
+
+def stream_gemini_response(prompt, chat_history):
+    """Yield the Gemini reply in text chunks as they are generated"""
+    return ManassuChat(chat_history).stream(prompt)
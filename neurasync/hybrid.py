@@ -0,0 +1,269 @@
+"""
+Local-first emotion analysis with a bounded Gemini vision fallback.
+
+The local model answers first. When it fails or its top confidence is below
+NEURASYNC_MIN_CONFIDENCE, Gemini is asked within a strict deadline, retrying
+with jittered backoff behind a circuit breaker. In "race" mode both run
+concurrently and the first good answer wins, which bounds tail latency at the
+cost of extra Gemini calls. Every result carries a "source" field: "local",
+"gemini" or "default".
+
+NEURASYNC_HYBRID_MODE selects the routing:
+
+local     local model only
+fallback  local first, Gemini when the local result is missing or weak (default)
+race      local and Gemini concurrently, first good answer
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from google.api_core import exceptions as api_exceptions
+
+from neurasync import gemini
+from neurasync.emotion import analyze_emotion, decode_base64, default_result
+from neurasync.metrics import count
+
+HYBRID_MODE = os.environ.get('NEURASYNC_HYBRID_MODE', 'fallback')
+
+# Local results whose top confidence (percent) is below this go to Gemini
+MIN_CONFIDENCE = float(os.environ.get('NEURASYNC_MIN_CONFIDENCE', '40'))
+
+# Seconds allowed for the local model and for Gemini including its retries
+LOCAL_DEADLINE = float(os.environ.get('NEURASYNC_LOCAL_DEADLINE', '5'))
+GEMINI_DEADLINE = float(os.environ.get('NEURASYNC_GEMINI_DEADLINE', '8'))
+
+# Gemini retries after the first attempt, and the base of the backoff in seconds
+GEMINI_RETRIES = int(os.environ.get('NEURASYNC_GEMINI_RETRIES', '2'))
+RETRY_BACKOFF = 0.25
+
+# Consecutive Gemini failures that open the breaker, and seconds it stays open
+BREAKER_THRESHOLD = int(os.environ.get('NEURASYNC_BREAKER_THRESHOLD', '5'))
+BREAKER_RESET = float(os.environ.get('NEURASYNC_BREAKER_RESET', '30'))
+
+MODES = ('local', 'fallback', 'race')
+
+# Gemini errors worth retrying and counting against the breaker: timeouts,
+# connection failures, 429 and 5xx. Anything else, such as a reply that failed
+# validation after its repair request, fails the call at once.
+TRANSIENT_ERRORS = (TimeoutError, ConnectionError, api_exceptions.TooManyRequests,
+                    api_exceptions.ResourceExhausted, api_exceptions.ServerError)
+
+# Blocking model and HTTP calls run on separate pools so Gemini calls that
+# are slow or past their deadline never hold threads the local path needs
+_local_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='hybrid-local')
+_gemini_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='hybrid-gemini')
+
+
+class CircuitBreaker:
+    """
+    Fail fast after repeated upstream failures
+
+    Opens after failure_threshold consecutive failures. After reset_seconds
+    one trial call is let through (half-open); its outcome closes the breaker
+    or opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Return whether a call may go upstream now"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+    def stats(self):
+        return {'state': self.state, 'failures': self.failures}
+
+
+def _jpeg_bytes(image):
+    """Gemini takes encoded images; pass bytes through, decode base64 and data URLs, encode arrays"""
+    if isinstance(image, str):
+        return decode_base64(image)
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return image
+    if hasattr(image, 'convert'):
+        image = np.asarray(image.convert('RGB'))[:, :, ::-1]
+    ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if not ok:
+        raise ValueError("Failed to encode image for Gemini")
+    return encoded.tobytes()
+
+
+def _confidence(result):
+    return float(result.get("primaryEmotion", {}).get("confidence", 0))
+
+
+class HybridAnalyzer:
+    """Route emotion analysis between the local model and Gemini"""
+
+    def __init__(self, mode=None, min_confidence=MIN_CONFIDENCE, local_deadline=LOCAL_DEADLINE,
+                 gemini_deadline=GEMINI_DEADLINE, retries=GEMINI_RETRIES, breaker=None, batched=False):
+        self.mode = mode or HYBRID_MODE
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown hybrid mode: {self.mode}")
+        self.min_confidence = min_confidence
+        self.local_deadline = local_deadline
+        self.gemini_deadline = gemini_deadline
+        self.retries = retries
+        self.breaker = breaker or CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET)
+        self.batched = batched
+
+    def _good_local(self, result):
+        return result is not None and _confidence(result) >= self.min_confidence
+
+    def _gemini_enabled(self):
+        return self.mode != 'local' and gemini.is_configured()
+
+    async def _run(self, pool, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+    async def analyze_local(self, image):
+        """Local result, or None if it failed or missed its deadline"""
+        try:
+            result = await asyncio.wait_for(self._run(_local_pool, analyze_emotion, image, self.batched),
+                                            self.local_deadline)
+        except Exception as e:
+            print(f"Error in local emotion detection: {str(e) or type(e).__name__}")
+            return None
+        result["source"] = "local"
+        return result
+
+    async def _gemini_with_retries(self, data, deadline):
+        for attempt in range(self.retries + 1):
+            # Out of time is not a Gemini failure, so it must not reach the breaker
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Gemini deadline exceeded")
+            if not self.breaker.allow():
+                raise RuntimeError("Gemini circuit breaker is open")
+            try:
+                # The request timeout stops the HTTP call itself, which wait_for cannot
+                result = await self._run(_gemini_pool, gemini.request_emotion_analysis, data,
+                                         gemini.MODEL_NAME, remaining)
+            except TRANSIENT_ERRORS:
+                self.breaker.record_failure()
+                if attempt == self.retries:
+                    raise
+                count('gemini_retry')
+                # Full jitter keeps concurrent retries from arriving together
+                await asyncio.sleep(min(random.uniform(0, RETRY_BACKOFF * 2 ** attempt),
+                                        max(0.0, deadline - time.monotonic())))
+                continue
+            except Exception:
+                # Gemini answered; the failure is in the request or the reply, not availability
+                self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def analyze_gemini(self, image):
+        """Gemini result, or None if unavailable, failing or past the deadline"""
+        if not self._gemini_enabled():
+            return None
+        try:
+            data = _jpeg_bytes(image)
+            deadline = time.monotonic() + self.gemini_deadline
+            result = await asyncio.wait_for(self._gemini_with_retries(data, deadline), self.gemini_deadline)
+        except Exception as e:
+            print(f"Error in Gemini emotion analysis: {str(e) or type(e).__name__}")
+            return None
+        return dict(result, source="gemini")
+
+    async def analyze(self, image):
+        """Return the best available result; never raises"""
+        if self.mode == 'race' and self._gemini_enabled():
+            result = await self._race(image)
+        else:
+            result = await self.analyze_local(image)
+            if not self._good_local(result) and self._gemini_enabled():
+                count('fallback')
+                result = await self.analyze_gemini(image) or result
+        if result is None:
+            count('default_result')
+            result = default_result()
+            result["source"] = "default"
+        return result
+
+    async def _race(self, image):
+        local = asyncio.ensure_future(self.analyze_local(image))
+        remote = asyncio.ensure_future(self.analyze_gemini(image))
+        pending = {local, remote}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if local in done and self._good_local(local.result()):
+                    return local.result()
+                if remote in done and remote.result() is not None:
+                    return remote.result()
+            # Neither answered well; a weak local result beats the default
+            return local.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def analyze_sync(self, image):
+        """Blocking wrapper for callers without an event loop"""
+        return asyncio.run(self.analyze(image))
+
+    def stats(self):
+        return {'mode': self.mode, 'minConfidence': self.min_confidence, 'breaker': self.breaker.stats()}
+
+
+_analyzers = {}
+_analyzers_lock = threading.Lock()
+
+
+def get_analyzer(mode=None, batched=False):
+    """Return the process-wide analyzer for a mode; analyzers of one process share a breaker"""
+    mode = mode or HYBRID_MODE
+    key = (mode, batched)
+    with _analyzers_lock:
+        analyzer = _analyzers.get(key)
+        if analyzer is None:
+            shared = next(iter(_analyzers.values())).breaker if _analyzers else None
+            analyzer = _analyzers[key] = HybridAnalyzer(mode, breaker=shared, batched=batched)
+    return analyzer
+
+
+def analyze_hybrid(image, mode=None, batched=False):
+    """Analyze one image with local-first routing and Gemini fallback"""
+    return get_analyzer(mode, batched).analyze_sync(image)
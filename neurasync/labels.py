@@ -0,0 +1,135 @@
+"""
+Canonical emotion label index shared by the detector, stress scoring,
+icons and recommendations.
+
+EMOTION_LABELS follows the output order of the emotion model, so score
+arrays can be indexed directly. Model and Gemini spellings (fear, surprise,
+disgust) are normalized to the display names used across the app.
+"""
+
+import numpy as np
+
+# Canonical labels, in the output order of the emotion model
+EMOTION_LABELS = ('angry', 'disgusted', 'fearful', 'happy', 'sad', 'surprised', 'neutral')
+LABEL_INDEX = {label: i for i, label in enumerate(EMOTION_LABELS)}
+
+# Other spellings seen from DeepFace and Gemini
+LABEL_ALIASES = {
+    'anger': 'angry',
+    'disgust': 'disgusted',
+    'fear': 'fearful',
+    'happiness': 'happy',
+    'sadness': 'sad',
+    'surprise': 'surprised',
+}
+
+# Map emotion to stress level
+STRESS_MAP = {
+    'happy': 15,
+    'neutral': 30,
+    'sad': 70,
+    'fearful': 85,
+    'angry': 90,
+    'disgusted': 75,
+    'surprised': 50
+}
+
+# STRESS_MAP in EMOTION_LABELS order, for vectorized scoring
+STRESS_WEIGHTS = np.array([STRESS_MAP[label] for label in EMOTION_LABELS], dtype=np.float32)
+
+EMOTION_ICONS = {
+    "happy": "😊",
+    "sad": "😢",
+    "angry": "😠",
+    "surprised": "😮",
+    "fearful": "😨",
+    "disgusted": "🤢",
+    "contempt": "😒",
+    "neutral": "😐",
+    "unknown": "❓",
+    "error": "⚠️"
+}
+
+EMOTION_RECOMMENDATIONS = {
+    "happy": [
+        "Savor this positive moment and reflect on what contributed to your happiness",
+        "Share your joy with someone else to amplify the positive emotions",
+        "Journal about this experience to revisit when you need a boost",
+        "Use this energy for a creative activity or task you've been putting off"
+    ],
+    "sad": [
+        "Practice self-compassion and acknowledge your feelings without judgment",
+        "Reach out to a trusted friend or family member for support",
+        "Engage in a gentle activity that typically brings you comfort",
+        "Try a brief mindfulness meditation focused on acceptance"
+    ],
+    "angry": [
+        "Take a few deep breaths to activate your parasympathetic nervous system",
+        "Find a physical outlet like a brief walk or stretching",
+        "Write down what's triggering your anger without censoring yourself",
+        "Consider if there's a boundary you need to establish or communicate"
+    ],
+    "surprised": [
+        "Give yourself time to process the unexpected information or event",
+        "Write down your initial reactions and questions",
+        "Seek additional information if needed before making decisions",
+        "Consider how this surprise might offer new opportunities"
+    ],
+    "fearful": [
+        "Practice grounding techniques like the 5-4-3-2-1 sensory exercise",
+        "Distinguish between real threats and anxiety-based thoughts",
+        "Break down overwhelming concerns into smaller, manageable parts",
+        "Reach out for support from trusted people in your life"
+    ],
+    "disgusted": [
+        "Remove yourself from the triggering situation if possible",
+        "Practice cleansing breathing exercises or visualization",
+        "Consider if this reaction connects to a deeper value or boundary",
+        "Engage in an activity that helps you feel restored"
+    ],
+    "contempt": [
+        "Practice empathy by considering alternative perspectives",
+        "Reflect on whether this reaction stems from unmet expectations",
+        "Consider if there are boundaries you need to establish",
+        "Try a brief mindfulness practice to create space between thoughts and reactions"
+    ],
+    "neutral": [
+        "Check in with yourself about any subtle emotions beneath the neutral surface",
+        "Consider what activities might engage or energize you right now",
+        "Use this balanced state for reflection or planning",
+        "Practice gratitude for moments of calm and equilibrium"
+    ]
+}
+
+DEFAULT_RECOMMENDATIONS = [
+    "Take a moment to reflect on how you're feeling",
+    "Practice a brief mindfulness exercise to connect with your emotions",
+    "Consider journaling about your current emotional state",
+    "Reach out to someone you trust if you need support"
+]
+
+
+def normalize_emotion(emotion):
+    """Return the canonical name for any known spelling of an emotion"""
+    name = emotion.lower().strip()
+    return LABEL_ALIASES.get(name, name)
+
+
+def scores_array(emotions):
+    """Return a float32 score vector in EMOTION_LABELS order from a {emotion: score} mapping"""
+    scores = np.zeros(len(EMOTION_LABELS), dtype=np.float32)
+    for name, score in emotions.items():
+        index = LABEL_INDEX.get(normalize_emotion(name))
+        if index is not None:
+            scores[index] = score
+    return scores
+
+
+def get_emotion_icon(emotion):
+    """Return an emoji icon based on the detected emotion"""
+    return EMOTION_ICONS.get(normalize_emotion(emotion), "❓")
+
+
+def get_emotion_recommendations(emotion):
+    """Return recommendations based on the detected emotion"""
+    return EMOTION_RECOMMENDATIONS.get(normalize_emotion(emotion), DEFAULT_RECOMMENDATIONS)
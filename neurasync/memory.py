@@ -0,0 +1,128 @@
+"""
+Token-budgeted conversation memory for Manassu chats.
+
+Messages are kept verbatim until the history exceeds token_budget; then
+everything but the last keep_turns exchanges (fewer if they alone fill half
+the budget) is folded into a running summary. The history sent to Gemini
+stays bounded however long the session runs, and one summary call covers
+many turns. Summaries are produced by a small Gemini model off the request
+path.
+"""
+
+import threading
+
+# Rough Gemini tokenizer ratio for English text; avoids a count_tokens round trip
+CHARS_PER_TOKEN = 4
+
+# Share of token_budget a compaction shrinks the history to, so the next one is several turns away
+COMPACT_TARGET = 0.5
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a supportive conversation between a user and
+Manassu, a therapeutic companion. Update the summary with the new messages.
+Keep the user's feelings, concerns, goals and anything Manassu suggested or
+promised to follow up on. Write in the third person, at most {words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+"""
+
+
+def estimate_tokens(text):
+    """Cheap token estimate for budget checks"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class ConversationMemory:
+    """Recent turns verbatim plus a rolling summary of everything older"""
+
+    def __init__(self, token_budget=3000, keep_turns=4, summary_tokens=300, summarize=None):
+        self.token_budget = token_budget
+        self.keep_messages = keep_turns * 2
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize
+        self.summary = ""
+        self.version = 0
+        self._messages = []  # (role, text) with role "user" or "model"
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_history(cls, history, **kwargs):
+        """Seed from Gemini-formatted history ({"role", "parts"} dicts)"""
+        memory = cls(**kwargs)
+        for message in history:
+            memory.add(message["role"], "".join(str(part) for part in message["parts"]))
+        return memory
+
+    def add(self, role, text):
+        with self._lock:
+            self._messages.append((role, text))
+            self._tokens += estimate_tokens(text)
+
+    @property
+    def tokens(self):
+        """Estimated tokens of the history that would be sent next turn"""
+        return self._tokens + (estimate_tokens(self.summary) if self.summary else 0)
+
+    def needs_compaction(self):
+        # Only the budget triggers: compacting whenever more than keep_turns
+        # exchanges are held would cost a summary call on nearly every turn
+        return self.tokens > self.token_budget and len(self._messages) > 2
+
+    def compact(self):
+        """Fold the oldest messages into the summary, leaving headroom below the budget"""
+        with self._lock:
+            fold = max(0, len(self._messages) - self.keep_messages)
+            tokens = self.tokens
+            target = self.token_budget * COMPACT_TARGET
+            # Still above the target with keep_turns messages: fold more, but keep the last exchange
+            while fold < len(self._messages) - 2 and \
+                    tokens - sum(estimate_tokens(text) for _, text in self._messages[:fold]) > target:
+                fold += 2
+            if fold == 0:
+                return False
+            folded = self._messages[:fold]
+            previous = self.summary
+
+        summary = self._summarize(previous, folded)
+
+        with self._lock:
+            # Only appends happen meanwhile, so the folded prefix is unchanged
+            del self._messages[:fold]
+            self._tokens -= sum(estimate_tokens(text) for _, text in folded)
+            self.summary = summary
+            self.version += 1
+        return True
+
+    def _summarize(self, summary, messages):
+        max_chars = self.summary_tokens * CHARS_PER_TOKEN
+        if self.summarize is not None:
+            try:
+                return self.summarize(summary, messages)[:max_chars]
+            except Exception as e:
+                print(f"Error summarizing conversation: {str(e)}")
+        # Without a summarizer keep the most recent part of a plain transcript
+        transcript = " ".join(f"{role}: {text}" for role, text in messages)
+        return f"{summary} {transcript}".strip()[-max_chars:]
+
+    def history(self):
+        """Gemini-formatted history: the summary as an opening exchange, then recent turns"""
+        with self._lock:
+            messages = list(self._messages)
+            summary = self.summary
+        history = []
+        if summary:
+            history.append({"role": "user", "parts": [f"Summary of our earlier conversation: {summary}"]})
+            history.append({"role": "model", "parts": ["Thank you, I'll keep that in mind."]})
+        history.extend({"role": role, "parts": [text]} for role, text in messages)
+        return history
+
+
+def summary_prompt(summary, messages, words=150):
+    """Build the summarization prompt for a batch of folded messages"""
+    lines = "\n".join(f"{'User' if role == 'user' else 'Manassu'}: {text}" for role, text in messages)
+    return SUMMARY_PROMPT.format(words=words, summary=summary or "(none yet)", messages=lines)
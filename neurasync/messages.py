@@ -0,0 +1,150 @@
+"""
+Compact per-session chat message store.
+
+Messages are __slots__ records with integer epoch timestamps. Only the most
+recent max_in_memory messages stay in memory; older ones are appended to a
+JSON-lines spill file and read back by offset when the user pages back, so a
+long conversation costs a bounded amount of memory per session. The spill
+file is deleted when the store is cleared or garbage-collected.
+
+Transcripts are private: spill files are created 0600 in a 0700 directory,
+by default a fresh per-process temporary directory removed at exit.
+"""
+
+import atexit
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from array import array
+from datetime import datetime
+
+# Messages kept in memory per session before older ones spill to disk
+MAX_IN_MEMORY = int(os.environ.get('NEURASYNC_CHAT_MEMORY_MESSAGES', '200'))
+
+# Messages shown at once, and added by each "load earlier"
+PAGE_SIZE = int(os.environ.get('NEURASYNC_CHAT_PAGE_SIZE', '20'))
+
+# Directory for spill files; unset uses a private temporary directory per process
+SPILL_DIR = os.environ.get('NEURASYNC_CHAT_SPILL_DIR')
+
+_spill_dir = None
+_spill_dir_lock = threading.Lock()
+
+
+def default_spill_dir():
+    """Return this process's private spill directory, created on first use"""
+    global _spill_dir
+    with _spill_dir_lock:
+        if _spill_dir is None:
+            _spill_dir = tempfile.mkdtemp(prefix='neurasync-chat-')
+            atexit.register(shutil.rmtree, _spill_dir, True)
+    return _spill_dir
+
+
+class Message:
+    """One chat message; role is "user" or "assistant", timestamp is epoch seconds"""
+
+    __slots__ = ('role', 'content', 'timestamp')
+
+    def __init__(self, role, content, timestamp=None):
+        self.role = role
+        self.content = content
+        self.timestamp = int(time.time()) if timestamp is None else int(timestamp)
+
+    def time_label(self):
+        return datetime.fromtimestamp(self.timestamp).strftime("%H:%M")
+
+    def to_dict(self):
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp}
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class MessageStore:
+    """Append-only message list with a bounded in-memory tail and a disk spill"""
+
+    def __init__(self, max_in_memory=MAX_IN_MEMORY, spill_dir=SPILL_DIR):
+        self.max_in_memory = max(1, max_in_memory)
+        self.spill_dir = spill_dir
+        self.spill_path = None  # created on the first spill, so short chats never touch disk
+        self._recent = []
+        self._offsets = array('q')  # byte offset of each spilled message
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._offsets) + len(self._recent)
+
+    @property
+    def spilled(self):
+        return len(self._offsets)
+
+    def append(self, role, content, timestamp=None):
+        message = Message(role, content, timestamp)
+        with self._lock:
+            self._recent.append(message)
+            if len(self._recent) > self.max_in_memory:
+                # Spill a quarter of the cap at a time so appends stay amortized O(1)
+                self._spill(max(1, self.max_in_memory // 4) + len(self._recent) - self.max_in_memory)
+        return message
+
+    def _spill(self, count):
+        if self.spill_path is None:
+            if self.spill_dir:
+                os.makedirs(self.spill_dir, mode=0o700, exist_ok=True)
+            directory = self.spill_dir or default_spill_dir()
+            self.spill_path = os.path.join(directory, f'{uuid.uuid4().hex}.jsonl')
+            weakref.finalize(self, _remove, self.spill_path)
+        fd = os.open(self.spill_path, os.O_CREAT | os.O_APPEND | os.O_WRONLY, 0o600)
+        with os.fdopen(fd, 'ab') as f:
+            offset = os.fstat(fd).st_size
+            for message in self._recent[:count]:
+                line = json.dumps(message.to_dict()).encode() + b'\n'
+                self._offsets.append(offset)
+                f.write(line)
+                offset += len(line)
+        del self._recent[:count]
+
+    def _read_spilled(self, start, end):
+        if start >= end:
+            return []
+        with open(self.spill_path, 'rb') as f:
+            f.seek(self._offsets[start])
+            return [Message(**json.loads(f.readline())) for _ in range(end - start)]
+
+    def window(self, start, end=None):
+        """Messages [start, end) in order, reading spilled ones from disk"""
+        with self._lock:
+            total = len(self)
+            end = total if end is None else min(end, total)
+            start = max(0, start)
+            spilled = len(self._offsets)
+            older = self._read_spilled(start, min(end, spilled))
+            return older + self._recent[max(0, start - spilled):max(0, end - spilled)]
+
+    def __iter__(self):
+        """Every message, oldest first; spilled messages stream from disk"""
+        with self._lock:
+            spilled = len(self._offsets)
+            recent = list(self._recent)
+        if spilled:
+            with open(self.spill_path, 'rb') as f:
+                for _ in range(spilled):
+                    yield Message(**json.loads(f.readline()))
+        yield from recent
+
+    def clear(self):
+        with self._lock:
+            self._recent = []
+            self._offsets = array('q')
+            if self.spill_path is not None:
+                _remove(self.spill_path)
@@ -0,0 +1,275 @@
+"""
+In-process latency histograms and event counters.
+
+Pipeline stages record their duration with timed(stage) and notable
+outcomes with count(event); the API server exposes everything in the
+Prometheus text format on /metrics. Stages:
+
+base64_decode       base64 (or data URL) to bytes
+imdecode            cv2.imdecode of JPEG/PNG bytes
+face_detection      face detector pass on one frame
+emotion_inference   one classifier call on a batch of face crops
+postprocess         score arrays to result dicts
+gemini_analysis     Gemini emotion request round trip
+gemini_chat         Gemini chat turn round trip
+gemini_first_token  time to the first streamed chat chunk
+
+Metrics live in the process that records them. With several server
+processes, set NEURASYNC_METRICS_DIR (neurasync.serve does) and call
+start_export() in each: every process then writes its metrics to a file
+there every EXPORT_INTERVAL seconds, and render() sums all the files, so a
+scrape served by any worker reports the whole server. Files of exited
+workers are kept so counters never go backwards.
+
+With the process backend, face_detection and emotion_inference run in the
+backend's worker processes and are not recorded here.
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from sub-millisecond decodes to slow Gemini calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Directory shared by the processes of one server, and how often each exports
+METRICS_DIR = os.environ.get('NEURASYNC_METRICS_DIR')
+EXPORT_INTERVAL = 5.0
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Latency histogram family keyed by the value of one label"""
+
+    def __init__(self, name, help, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                # Per-bucket counts (last one is +Inf), sum, count
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    @contextmanager
+    def time(self, label_value):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - start)
+
+    def state(self):
+        """{label value: [per-bucket counts, sum, count]}, JSON-serializable"""
+        with self._lock:
+            return {key: [list(counts), total, count] for key, (counts, total, count) in self._series.items()}
+
+    @staticmethod
+    def merge(states):
+        merged = {}
+        for state in states:
+            for key, (counts, total, count) in state.items():
+                series = merged.get(key)
+                if series is None:
+                    merged[key] = [list(counts), total, count]
+                else:
+                    series[0] = [a + b for a, b in zip(series[0], counts)]
+                    series[1] += total
+                    series[2] += count
+        return merged
+
+    def snapshot(self, state=None):
+        """{label value: {"count", "sum", "buckets"}} with cumulative bucket counts"""
+        snapshot = {}
+        for key, (counts, total, count) in (self.state() if state is None else state).items():
+            cumulative, running = [], 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                running += n
+                cumulative.append((bound, running))
+            snapshot[key] = {'count': count, 'sum': total, 'buckets': cumulative}
+        return snapshot
+
+    def render(self, state=None):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, series in sorted(self.snapshot(state).items()):
+            label = f'{self.label}="{_escape(key)}"'
+            for bound, n in series['buckets']:
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{label},le="{le}"}} {n}')
+            lines.append(f'{self.name}_sum{{{label}}} {_number(series["sum"])}')
+            lines.append(f'{self.name}_count{{{label}}} {series["count"]}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter family keyed by the value of one label"""
+
+    def __init__(self, name, help, label):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def state(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self, state=None):
+        return render_counter(self.name, self.help, self.label, self.state() if state is None else state)
+
+
+def render_counter(name, help, label, values):
+    """Prometheus text lines for a counter family given as {label value: value}"""
+    lines = [f'# HELP {name} {help}', f'# TYPE {name} counter']
+    for key, value in sorted(values.items()):
+        lines.append(f'{name}{{{label}="{_escape(key)}"}} {_number(value)}')
+    return lines
+
+
+def _sum_values(states):
+    merged = {}
+    for state in states:
+        for key, value in state.items():
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+stage_seconds = Histogram('neurasync_stage_seconds', 'Latency of emotion and Gemini pipeline stages.', 'stage')
+request_seconds = Histogram('neurasync_request_seconds', 'API request latency until the response starts.',
+                            'endpoint')
+events = Counter('neurasync_events_total', 'Pipeline events such as fallbacks and default results.', 'event')
+
+HISTOGRAMS = (stage_seconds, request_seconds)
+COUNTERS = (events,)
+
+# Callables returning counter families read at collection time
+_collectors = []
+
+
+def timed(stage):
+    """Context manager recording the duration of a pipeline stage"""
+    return stage_seconds.time(stage)
+
+
+def count(event, amount=1):
+    events.inc(event, amount)
+
+
+def register_collector(collect):
+    """
+    Add counters kept elsewhere, e.g. cache hit counts
+
+    collect() returns (name, help, label, {label value: value}) tuples; it is
+    called on every scrape and export.
+    """
+    _collectors.append(collect)
+
+
+def local_state():
+    """Everything this process has recorded, JSON-serializable"""
+    return {
+        'histograms': {metric.name: metric.state() for metric in HISTOGRAMS},
+        'counters': {metric.name: metric.state() for metric in COUNTERS},
+        'collected': [list(family) for collect in _collectors for family in collect()]
+    }
+
+
+_export_path = None
+_export_lock = threading.Lock()
+
+
+def export():
+    """Write this process's state to its file in METRICS_DIR"""
+    global _export_path
+    with _export_lock:
+        if _export_path is None:
+            # Unique per process lifetime: a recycled pid must not overwrite a dead worker's totals
+            _export_path = os.path.join(METRICS_DIR, f'metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+        tmp = _export_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(local_state(), f)
+        os.replace(tmp, _export_path)
+
+
+def start_export(interval=EXPORT_INTERVAL):
+    """Export this process's metrics periodically and at exit; no-op without METRICS_DIR"""
+    if not METRICS_DIR:
+        return
+
+    def _run():
+        while True:
+            time.sleep(interval)
+            try:
+                export()
+            except OSError as e:
+                print(f"Error exporting metrics: {str(e)}")
+
+    export()
+    atexit.register(export)
+    threading.Thread(target=_run, name='metrics-export', daemon=True).start()
+
+
+def clear_exports(directory):
+    """Remove exported metrics files, e.g. when a server starts"""
+    for name in os.listdir(directory):
+        if name.startswith('metrics-') and name.endswith('.json'):
+            os.remove(os.path.join(directory, name))
+
+
+def collect():
+    """This process's live state plus, with METRICS_DIR, the latest export of every other process"""
+    states = [local_state()]
+    if METRICS_DIR:
+        own = os.path.basename(_export_path) if _export_path else None
+        for name in os.listdir(METRICS_DIR):
+            if name.startswith('metrics-') and name.endswith('.json') and name != own:
+                try:
+                    with open(os.path.join(METRICS_DIR, name)) as f:
+                        states.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+    return states
+
+
+def render():
+    """Every metric of every process, in the Prometheus text exposition format"""
+    states = collect()
+    lines = []
+    for metric in HISTOGRAMS:
+        lines.extend(metric.render(Histogram.merge(state['histograms'].get(metric.name, {}) for state in states)))
+    for metric in COUNTERS:
+        lines.extend(metric.render(_sum_values(state['counters'].get(metric.name, {}) for state in states)))
+
+    families = {}
+    for state in states:
+        for name, help, label, values in state['collected']:
+            families.setdefault(name, (help, label, []))[2].append(values)
+    for name, (help, label, values) in families.items():
+        lines.extend(render_counter(name, help, label, _sum_values(values)))
+    return '\n'.join(lines) + '\n'
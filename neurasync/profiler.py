@@ -0,0 +1,125 @@
+"""
+Low-overhead sampling profiler that can be switched on in a running server.
+
+A daemon thread snapshots the stack of every other thread each interval and
+counts identical stacks. Nothing is traced between samples, so the cost is
+one stack walk per thread per interval and zero while stopped. folded()
+returns the counts in the collapsed-stack format read by flamegraph.pl and
+speedscope; stats() lists the functions seen most often.
+
+Start it with NEURASYNC_PROFILE=1, or at runtime through the API server's
+/api/profiler endpoint when NEURASYNC_PROFILER_TOKEN is set.
+"""
+
+import os
+import sys
+import threading
+from collections import Counter
+
+PROFILE_AT_START = os.environ.get('NEURASYNC_PROFILE', '0') == '1'
+
+# Seconds between samples
+PROFILE_INTERVAL = float(os.environ.get('NEURASYNC_PROFILE_INTERVAL', '0.01'))
+
+# Distinct stacks kept; samples of new stacks past this are counted as dropped
+MAX_STACKS = 20000
+MAX_DEPTH = 64
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Periodically sample all thread stacks into collapsed-stack counts"""
+
+    def __init__(self, interval=PROFILE_INTERVAL, max_stacks=MAX_STACKS, max_depth=MAX_DEPTH):
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.max_depth = max_depth
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.samples = 0
+        self.dropped = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        """Start sampling (no-op if already running); interval changes the sampling period"""
+        with self._lock:
+            if interval:
+                self.interval = interval
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+            self.dropped = 0
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None and len(frames) < self.max_depth:
+                    frames.append(_frame_name(frame))
+                    frame = frame.f_back
+                frames.append(names.get(ident, 'thread'))
+                stacks.append(';'.join(reversed(frames)))
+            with self._lock:
+                self.samples += 1
+                for stack in stacks:
+                    if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                        self._stacks[stack] += 1
+                    else:
+                        self.dropped += 1
+
+    def folded(self):
+        """Collapsed stacks, one "thread;outer;...;inner count" line each, most frequent first"""
+        with self._lock:
+            return ''.join(f"{stack} {n}\n" for stack, n in self._stacks.most_common())
+
+    def stats(self, top=20):
+        """Sampling state and the functions most often on top of a stack"""
+        with self._lock:
+            leaves = Counter()
+            for stack, n in self._stacks.items():
+                leaves[stack.rsplit(';', 1)[-1]] += n
+            total = sum(leaves.values())
+            return {
+                'running': self.running,
+                'interval': self.interval,
+                'samples': self.samples,
+                'stacks': len(self._stacks),
+                'dropped': self.dropped,
+                'top': [{'function': name, 'samples': n, 'share': round(n / total, 4)}
+                        for name, n in leaves.most_common(top)]
+            }
+
+
+_profiler = SamplingProfiler()
+
+
+def get_profiler():
+    """Return the process-wide SamplingProfiler"""
+    return _profiler
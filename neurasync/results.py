@@ -0,0 +1,90 @@
+"""
+The emotion result shape shared by the local detector and Gemini.
+
+    {
+      "primaryEmotion": {"name": <EMOTION_LABELS>, "confidence": <int 0-100>},
+      "secondaryEmotion": {"name": <EMOTION_LABELS>, "confidence": <int 0-100>},
+      "stressLevel": <int 0-100>,
+      "insight": <str>
+    }
+
+Local results may also carry "emotions" (per-label scores) and routing adds
+"source". RESULT_SCHEMA constrains Gemini's structured output to this shape,
+and validate_result checks and normalizes a parsed reply into it.
+"""
+
+from neurasync.labels import EMOTION_LABELS, LABEL_INDEX, STRESS_MAP, normalize_emotion
+
+_EMOTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string", "enum": list(EMOTION_LABELS)},
+        "confidence": {"type": "integer", "description": "0-100"}
+    },
+    "required": ["name", "confidence"]
+}
+
+# Gemini response_schema (OpenAPI subset) for emotion analysis
+RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "primaryEmotion": _EMOTION_SCHEMA,
+        "secondaryEmotion": _EMOTION_SCHEMA,
+        "stressLevel": {"type": "integer", "description": "0-100"},
+        "insight": {"type": "string"}
+    },
+    "required": ["primaryEmotion", "secondaryEmotion", "stressLevel", "insight"]
+}
+
+
+def _number(value, field):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{field} must be a number, got {value!r}")
+    return value
+
+
+def _percent(value):
+    return int(round(min(100.0, max(0.0, float(value)))))
+
+
+def _emotion(data, field):
+    if not isinstance(data, dict):
+        raise ValueError(f"{field} must be an object")
+    name = normalize_emotion(str(data.get("name", "")))
+    if name not in LABEL_INDEX:
+        raise ValueError(f"{field}.name is not a known emotion: {data.get('name')!r}")
+    return name, _number(data.get("confidence"), f"{field}.confidence")
+
+
+def validate_result(data):
+    """
+    Return a normalized copy of an emotion result, raising ValueError if it is unusable
+
+    Names are mapped to EMOTION_LABELS. Confidences given as fractions (floats
+    no greater than 1) are scaled to percent, and all percentages are clamped
+    to integers in 0-100. A missing secondary emotion becomes neutral at 0 and
+    a missing stress level is derived from the primary emotion.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Emotion result must be an object")
+    primary, primary_confidence = _emotion(data.get("primaryEmotion"), "primaryEmotion")
+    if data.get("secondaryEmotion") is not None:
+        secondary, secondary_confidence = _emotion(data["secondaryEmotion"], "secondaryEmotion")
+    else:
+        secondary, secondary_confidence = "neutral", 0
+
+    confidences = (primary_confidence, secondary_confidence)
+    if max(confidences) <= 1 and any(isinstance(value, float) for value in confidences):
+        primary_confidence, secondary_confidence = primary_confidence * 100, secondary_confidence * 100
+
+    stress = data.get("stressLevel")
+    result = {
+        "stressLevel": STRESS_MAP[primary] if stress is None else _percent(_number(stress, "stressLevel")),
+        "primaryEmotion": {"name": primary, "confidence": _percent(primary_confidence)},
+        "secondaryEmotion": {"name": secondary, "confidence": _percent(secondary_confidence)},
+        "insight": str(data.get("insight") or "")
+    }
+    for key in ("emotions", "source"):
+        if key in data:
+            result[key] = data[key]
+    return result
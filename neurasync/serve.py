@@ -0,0 +1,122 @@
+"""
+Standalone production server for the emotion API.
+
+    python -m neurasync.serve --workers 4 --port 8502
+
+Runs neurasync.api under gunicorn with threaded workers. Each worker loads
+and warms its own emotion model before it accepts traffic, and SIGTERM
+drains in-flight requests within the graceful timeout.
+"""
+
+import argparse
+import multiprocessing
+import os
+import secrets
+import tempfile
+
+from gunicorn.app.base import BaseApplication
+
+# neurasync.api is only imported in the workers, after fork, so the master
+# holds no model, threads or sockets of the app; this mirrors its body limit
+MAX_CONTENT_LENGTH = int(os.environ.get('NEURASYNC_MAX_CONTENT_LENGTH', str(16 * 1024 * 1024)))
+
+
+def _post_worker_init(worker):
+    from neurasync import metrics
+    from neurasync.emotion import start_engine
+    from neurasync.profiler import PROFILE_AT_START, get_profiler
+
+    # Publish this worker's metrics so /metrics on any worker covers all of them
+    metrics.start_export()
+
+    # Threads do not survive fork; each worker samples itself
+    if PROFILE_AT_START:
+        get_profiler().start()
+    # Block until this worker's model is warm so it only sees traffic when ready
+    start_engine(background=False)
+    worker.log.info("Emotion engine warm in worker %s", worker.pid)
+
+
+class EmotionAPIServer(BaseApplication):
+    """Embedded gunicorn application serving neurasync.api.app"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from neurasync.api import app
+        return app
+
+
+def build_options(args):
+    """Translate command-line arguments to gunicorn settings"""
+    return {
+        'bind': f'{args.host}:{args.port}',
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        'keepalive': args.keepalive,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'backlog': args.backlog,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10 if args.max_requests else 0,
+        'limit_request_line': 8190,
+        'limit_request_field_size': 8190,
+        # The model must be loaded after fork, once per worker
+        'preload_app': False,
+        'post_worker_init': _post_worker_init,
+        'accesslog': args.access_log,
+    }
+
+
+def parse_args(argv=None):
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="Serve the Neurasync emotion API")
+    parser.add_argument('--host', default=env('NEURASYNC_API_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(env('NEURASYNC_API_PORT', '8502')))
+    parser.add_argument('--workers', type=int,
+                        default=int(env('NEURASYNC_API_WORKERS', str(min(4, multiprocessing.cpu_count())))),
+                        help="worker processes, each holding one warm model")
+    parser.add_argument('--threads', type=int, default=int(env('NEURASYNC_API_THREADS', '8')),
+                        help="request threads per worker, feeding the micro-batcher")
+    parser.add_argument('--keepalive', type=int, default=int(env('NEURASYNC_API_KEEPALIVE', '5')),
+                        help="seconds to hold idle keep-alive connections")
+    parser.add_argument('--timeout', type=int, default=int(env('NEURASYNC_API_TIMEOUT', '120')),
+                        help="seconds before a silent worker is restarted (covers model load)")
+    parser.add_argument('--graceful-timeout', type=int, default=int(env('NEURASYNC_API_GRACEFUL_TIMEOUT', '30')),
+                        help="seconds to finish in-flight requests on shutdown")
+    parser.add_argument('--backlog', type=int, default=2048)
+    parser.add_argument('--max-requests', type=int, default=int(env('NEURASYNC_API_MAX_REQUESTS', '0')),
+                        help="recycle a worker after this many requests (0 disables)")
+    parser.add_argument('--access-log', default=env('NEURASYNC_API_ACCESS_LOG'),
+                        help="access log path, or - for stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Workers inherit the environment at fork and share this directory for /metrics
+    metrics_dir = os.environ.get('NEURASYNC_METRICS_DIR')
+    if metrics_dir:
+        from neurasync.metrics import clear_exports
+
+        os.makedirs(metrics_dir, exist_ok=True)
+        clear_exports(metrics_dir)
+    else:
+        os.environ['NEURASYNC_METRICS_DIR'] = tempfile.mkdtemp(prefix='neurasync-metrics-')
+    # Every worker must accept the session IDs the others issue
+    os.environ.setdefault('NEURASYNC_SESSION_SECRET', secrets.token_hex(32))
+    print(f"Serving emotion API on {args.host}:{args.port} with {args.workers} workers "
+          f"(max body {MAX_CONTENT_LENGTH} bytes)")
+    EmotionAPIServer(build_options(args)).run()
+
+
+if __name__ == '__main__':
+    main()
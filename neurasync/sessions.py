@@ -0,0 +1,38 @@
+"""
+Server-issued session IDs.
+
+Chats and saved analyses are keyed by a session ID that only the server
+mints: a random part plus an HMAC of it under SESSION_SECRET. A caller can
+use an ID it was given but cannot make one up or guess another user's.
+
+Set NEURASYNC_SESSION_SECRET to keep IDs valid across restarts and shared by
+several server processes; neurasync.serve sets one for its workers if unset.
+Without it each process signs with its own random secret.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+
+SESSION_SECRET = (os.environ.get('NEURASYNC_SESSION_SECRET') or secrets.token_hex(32)).encode()
+
+
+def _sign(value):
+    digest = hmac.new(SESSION_SECRET, value.encode(), hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).decode().rstrip('=')
+
+
+def new_session_id():
+    """Mint a fresh session ID"""
+    value = secrets.token_urlsafe(18)
+    return f"{value}.{_sign(value)}"
+
+
+def is_session_id(session_id):
+    """Whether session_id was minted by new_session_id under this secret"""
+    if not isinstance(session_id, str) or session_id.count('.') != 1:
+        return False
+    value, signature = session_id.split('.')
+    return hmac.compare_digest(signature.encode(), _sign(value).encode())
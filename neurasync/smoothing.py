@@ -0,0 +1,79 @@
+"""
+Incremental smoothing of emotion distributions over a frame sequence.
+
+EmotionSmoother keeps the last `window` distributions in a fixed NumPy ring
+buffer with a running sum (or an exponential moving average when alpha is
+set), so every update is O(1). Stress is the expected stress over the
+smoothed distribution rather than a lookup of the single argmax emotion.
+"""
+
+import numpy as np
+
+from neurasync.labels import EMOTION_LABELS, STRESS_WEIGHTS, scores_array
+
+
+class EmotionSmoother:
+    """Per-session running estimate of the emotion distribution and stress level"""
+
+    def __init__(self, window=30, alpha=None):
+        self.window = window
+        self.alpha = alpha
+        self._ring = np.zeros((window, len(EMOTION_LABELS)), dtype=np.float32)
+        self._sum = np.zeros(len(EMOTION_LABELS), dtype=np.float64)
+        self._ema = None
+        self._next = 0
+        self.count = 0
+
+    def update(self, scores):
+        """Add one distribution (array in EMOTION_LABELS order or {emotion: score}) and return the result"""
+        if isinstance(scores, dict):
+            scores = scores_array(scores)
+        scores = np.asarray(scores, dtype=np.float32)
+        total = scores.sum()
+        if total > 0:
+            scores = scores * (100.0 / total)
+
+        if self.alpha is not None:
+            self._ema = scores.astype(np.float64) if self._ema is None else \
+                self._ema + self.alpha * (scores - self._ema)
+        else:
+            self._sum += scores - self._ring[self._next]
+            self._ring[self._next] = scores
+            self._next = (self._next + 1) % self.window
+        self.count += 1
+        return self.result()
+
+    @property
+    def distribution(self):
+        """Smoothed distribution in EMOTION_LABELS order, as percentages"""
+        if self.count == 0:
+            return np.zeros(len(EMOTION_LABELS), dtype=np.float64)
+        if self.alpha is not None:
+            return self._ema
+        return self._sum / min(self.count, self.window)
+
+    @property
+    def stress_level(self):
+        return round(float(self.distribution @ STRESS_WEIGHTS) / 100.0)
+
+    def result(self):
+        """Smoothed primary/secondary emotions and stress level, or None before the first update"""
+        if self.count == 0:
+            return None
+        dist = self.distribution
+        second, first = np.argpartition(dist, -2)[-2:]
+        if dist[second] > dist[first]:
+            first, second = second, first
+        return {
+            "stressLevel": self.stress_level,
+            "primaryEmotion": {"name": EMOTION_LABELS[first], "confidence": round(float(dist[first]))},
+            "secondaryEmotion": {"name": EMOTION_LABELS[second], "confidence": round(float(dist[second]))},
+            "samples": min(self.count, self.window) if self.alpha is None else self.count
+        }
+
+    def reset(self):
+        self._ring[:] = 0
+        self._sum[:] = 0
+        self._ema = None
+        self._next = 0
+        self.count = 0
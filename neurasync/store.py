@@ -0,0 +1,309 @@
+"""
+Append-only local store for emotion analyses.
+
+Results go into one SQLite database per day (WAL mode) under
+NEURASYNC_STORE_DIR. append() only enqueues; a background writer drains the
+queue and inserts whole batches in one transaction, so saving from the UI,
+an API request or a frame stream never waits on disk. Old days can be
+archived or deleted by moving their files.
+
+With NEURASYNC_ANALYSIS_FORWARD_URL set (e.g. the Node backend's
+/api/analysis/save), records appended with forward=True are also POSTed
+there from a separate thread once they are stored.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+STORE_DIR = os.environ.get('NEURASYNC_STORE_DIR', 'data/analyses')
+FORWARD_URL = os.environ.get('NEURASYNC_ANALYSIS_FORWARD_URL')
+
+# Writer batching: rows per transaction and the longest a row waits for one
+WRITE_BATCH_SIZE = 256
+WRITE_INTERVAL = 0.5
+
+# Records held in memory before append() starts dropping them
+MAX_QUEUE = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    session TEXT,
+    source TEXT,
+    primary_emotion TEXT,
+    primary_confidence INTEGER,
+    secondary_emotion TEXT,
+    secondary_confidence INTEGER,
+    stress_level INTEGER,
+    insight TEXT,
+    emotions TEXT
+)
+"""
+
+_COLUMNS = ('ts', 'session', 'source', 'primary_emotion', 'primary_confidence', 'secondary_emotion',
+            'secondary_confidence', 'stress_level', 'insight', 'emotions')
+
+
+def partition_name(ts):
+    """Database file name of the UTC day containing ts"""
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('analyses-%Y%m%d.sqlite3')
+
+
+def to_record(result, session=None, source=None, ts=None):
+    """Flatten an emotion result into a row tuple in _COLUMNS order"""
+    primary = result.get('primaryEmotion') or {}
+    secondary = result.get('secondaryEmotion') or {}
+    emotions = result.get('emotions')
+    return (ts or time.time(), session, source or result.get('source'),
+            primary.get('name'), primary.get('confidence'),
+            secondary.get('name'), secondary.get('confidence'),
+            result.get('stressLevel'), result.get('insight'),
+            json.dumps(emotions) if emotions is not None else None)
+
+
+def from_row(row):
+    """Rebuild the result dict of a stored row"""
+    record = dict(zip(('id',) + _COLUMNS, row))
+    return {
+        'id': record['id'],
+        'timestamp': record['ts'],
+        'session': record['session'],
+        'source': record['source'],
+        'stressLevel': record['stress_level'],
+        'primaryEmotion': {'name': record['primary_emotion'], 'confidence': record['primary_confidence']},
+        'secondaryEmotion': {'name': record['secondary_emotion'], 'confidence': record['secondary_confidence']},
+        'insight': record['insight'],
+        'emotions': json.loads(record['emotions']) if record['emotions'] else None
+    }
+
+
+class AnalysisForwarder:
+    """POST stored analyses to another service from a background thread"""
+
+    def __init__(self, url, timeout=5.0, max_queue=1000):
+        import requests
+
+        self.url = url
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._queue = queue.Queue(max_queue)
+        self.sent = 0
+        self.errors = 0
+        self.dropped = 0
+        threading.Thread(target=self._run, name='analysis-forwarder', daemon=True).start()
+
+    def submit(self, result):
+        try:
+            self._queue.put_nowait(result)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            result = self._queue.get()
+            payload = {key: result.get(key) for key in
+                       ('stressLevel', 'primaryEmotion', 'secondaryEmotion', 'insight')}
+            try:
+                self._session.post(self.url, json=payload, timeout=self.timeout).raise_for_status()
+                self.sent += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"Error forwarding analysis: {str(e)}")
+
+    def stats(self):
+        return {'url': self.url, 'sent': self.sent, 'errors': self.errors, 'dropped': self.dropped,
+                'queued': self._queue.qsize()}
+
+
+class AnalysisStore:
+    """Day-partitioned SQLite store fed by a batching background writer"""
+
+    def __init__(self, directory=STORE_DIR, forward_url=FORWARD_URL, batch_size=WRITE_BATCH_SIZE,
+                 interval=WRITE_INTERVAL, max_queue=MAX_QUEUE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.batch_size = batch_size
+        self.interval = interval
+        self.forwarder = AnalysisForwarder(forward_url) if forward_url else None
+        self._queue = queue.Queue(max_queue)
+        self._connections = {}
+        self._done = threading.Condition()
+        self.appended = 0
+        self.processed = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.batches = 0
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name='analysis-writer', daemon=True)
+        self._writer.start()
+
+    def append(self, result, session=None, source=None, forward=False):
+        """Queue one emotion result for storage; returns False if it was dropped"""
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait((to_record(result, session, source), result if forward else None))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        with self._done:
+            self.appended += 1
+        return True
+
+    def _connect(self, name):
+        connection = self._connections.get(name)
+        if connection is None:
+            # Only the current and previous day are written; close older partitions
+            while len(self._connections) >= 2:
+                self._connections.pop(min(self._connections)).close()
+            connection = sqlite3.connect(os.path.join(self.directory, name), check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(SCHEMA)
+            self._connections[name] = connection
+        return connection
+
+    def _drain(self):
+        """
+        Block for the first item, then collect until the batch is full or the interval passes
+
+        Returns (batch, stop); stop is set once close() has been called.
+        """
+        batch = []
+        item = self._queue.get()
+        deadline = time.monotonic() + self.interval
+        while item is not None:
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.batch_size or remaining <= 0:
+                return batch, False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    def _write(self, records):
+        partitions = {}
+        for record in records:
+            partitions.setdefault(partition_name(record[0]), []).append(record)
+        for name, records in partitions.items():
+            connection = self._connect(name)
+            with connection:
+                connection.executemany(
+                    f"INSERT INTO analyses ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    records)
+
+    def _commit(self, batch):
+        """Insert a batch, falling back to one row at a time; return the items committed"""
+        try:
+            self._write([record for record, _ in batch])
+            self.batches += 1
+            return batch
+        except Exception as e:
+            print(f"Error writing analyses, retrying row by row: {str(e)}")
+
+        # One bad row must not cost the other rows of its batch
+        committed = []
+        for item in batch:
+            try:
+                self._write([item[0]])
+                committed.append(item)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error writing analysis: {str(e)}")
+        return committed
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._drain()
+            if not batch:
+                continue
+            committed = self._commit(batch)
+            if self.forwarder is not None:
+                for _, result in committed:
+                    if result is not None:
+                        self.forwarder.submit(result)
+            with self._done:
+                self.written += len(committed)
+                self.processed += len(batch)
+                self._done.notify_all()
+
+    def flush(self, timeout=None):
+        """Wait until everything appended so far has been processed; return whether it was"""
+        with self._done:
+            target = self.appended
+            return self._done.wait_for(lambda: self.processed >= target, timeout)
+
+    def close(self, timeout=5.0):
+        """Write what is queued and stop the writer"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join(timeout)
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
+
+    def partitions(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.startswith('analyses-') and name.endswith('.sqlite3'))
+
+    def query(self, start=None, end=None, session=None, limit=100):
+        """Return stored results with start <= timestamp < end, newest first"""
+        start_name = partition_name(start) if start else None
+        end_name = partition_name(end) if end else None
+        clauses, params = [], []
+        for column, op, value in (('ts', '>=', start), ('ts', '<', end), ('session', '=', session)):
+            if value is not None:
+                clauses.append(f'{column} {op} ?')
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+        results = []
+        for name in reversed(self.partitions()):
+            if (start_name and name < start_name) or (end_name and name > end_name):
+                continue
+            # Read-only connection: WAL readers never block the writer
+            connection = sqlite3.connect(f'file:{os.path.join(self.directory, name)}?mode=ro', uri=True)
+            try:
+                rows = connection.execute(
+                    f"SELECT id, {', '.join(_COLUMNS)} FROM analyses {where} ORDER BY ts DESC LIMIT ?",
+                    params + [limit - len(results)]).fetchall()
+            finally:
+                connection.close()
+            results.extend(from_row(row) for row in rows)
+            if len(results) >= limit:
+                break
+        return results
+
+    def stats(self):
+        stats = {'directory': self.directory, 'appended': self.appended, 'written': self.written,
+                 'dropped': self.dropped, 'errors': self.errors, 'batches': self.batches,
+                 'queued': self._queue.qsize(), 'partitions': len(self.partitions())}
+        if self.forwarder is not None:
+            stats['forwarder'] = self.forwarder.stats()
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide AnalysisStore"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AnalysisStore()
+    return _store
@@ -0,0 +1,233 @@
+"""
+Real-time emotion tracking over a stream of video frames.
+
+The face detector only runs every detect_every analyzed frames; in between,
+the face box is followed by template matching and only the cropped face goes
+through the emotion model, at no more than target_fps. Frames over that rate
+are dropped before they are decoded. Detection and classification run on the
+configured execution backend. LatestFrame sits between a producer and the
+tracker and drops stale frames, so latency stays bounded when inference falls
+behind the camera.
+"""
+
+import asyncio
+import threading
+import time
+
+import cv2
+
+from neurasync.emotion import build_result, get_backend, load_image
+from neurasync.smoothing import EmotionSmoother
+
+
+class LatestFrame:
+    """Single-slot frame buffer: put() replaces any frame not yet consumed"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self.received += 1
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def get(self, timeout=None):
+        """Return the newest frame, or None once closed and drained or on timeout"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._frame is not None or self._closed, timeout)
+            frame, self._frame = self._frame, None
+            return frame
+
+    def __iter__(self):
+        while True:
+            frame = self.get()
+            if frame is None:
+                return
+            yield frame
+
+
+class FaceTracker:
+    """Follow a face box between detector runs by template matching near its last position"""
+
+    def __init__(self, search_margin=0.5, min_score=0.5):
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self.box = None
+        self._template = None
+
+    def reset(self, img, box):
+        self.box = box
+        if box is None:
+            self._template = None
+            return
+        x, y, w, h = box
+        self._template = cv2.cvtColor(img[y:y + h, x:x + w], cv2.COLOR_BGR2GRAY)
+
+    def update(self, img):
+        """Return the tracked box in img, or None when the face is lost"""
+        if self._template is None:
+            return None
+        x, y, w, h = self.box
+        frame_h, frame_w = img.shape[:2]
+        mx, my = int(w * self.search_margin), int(h * self.search_margin)
+        x0, y0 = max(0, x - mx), max(0, y - my)
+        x1, y1 = min(frame_w, x + w + mx), min(frame_h, y + h + my)
+        if x1 - x0 < w or y1 - y0 < h:
+            return None
+
+        region = cv2.cvtColor(img[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+        scores = cv2.matchTemplate(region, self._template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        if best < self.min_score:
+            return None
+        self.box = (x0 + bx, y0 + by, w, h)
+        return self.box
+
+
+class EmotionTracker:
+    """Per-stream state: detection cadence, face tracker and frame-rate limiter"""
+
+    def __init__(self, detect_every=5, target_fps=5.0, backend=None, smooth_window=15):
+        self.detect_every = max(1, detect_every)
+        self.min_interval = 1.0 / target_fps if target_fps else 0.0
+        self.backend = backend or get_backend()
+        self.tracker = FaceTracker()
+        self.smoother = EmotionSmoother(window=smooth_window)
+        self.frames_seen = 0
+        self.frames_analyzed = 0
+        self._since_detection = self.detect_every
+        self._last_analyzed = None
+
+    def due(self, timestamp):
+        """Count a frame arriving at timestamp and return whether it should be analyzed"""
+        self.frames_seen += 1
+        if self._last_analyzed is not None and timestamp - self._last_analyzed < self.min_interval:
+            return False
+        self._last_analyzed = timestamp
+        return True
+
+    def process(self, img, timestamp=None):
+        """
+        Analyze one BGR frame and return a result dict, or None when the
+        frame is skipped to hold the target frame rate
+        """
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        if not self.due(timestamp):
+            return None
+        return self.analyze(img, timestamp)
+
+    def analyze(self, img, timestamp):
+        """Analyze a frame already admitted by due()"""
+        detected = False
+        box = scores = None
+        if self._since_detection < self.detect_every:
+            box = self.tracker.update(img)
+        if box is None:
+            # Detection and classification of the largest face in one backend call
+            faces = self.backend.analyze_faces_batch([img], 1)[0]
+            if faces:
+                box, scores = faces[0]
+                box = tuple(int(v) for v in box)
+            self.tracker.reset(img, box)
+            self._since_detection = 0
+            detected = True
+        self._since_detection += 1
+
+        if scores is None:
+            x, y, w, h = box if box is not None else (0, 0, img.shape[1], img.shape[0])
+            scores = self.backend.classify_batch([img[y:y + h, x:x + w]])[0]
+        self.frames_analyzed += 1
+
+        result = build_result(scores)
+        result.update({
+            'frame': self.frames_seen,
+            'timestamp': timestamp,
+            'faceBox': list(box) if box is not None else None,
+            'detected': detected,
+            'smoothed': self.smoother.update(scores)
+        })
+        return result
+
+
+def track_emotions(frames, detect_every=5, target_fps=5.0, live=False):
+    """
+    Yield emotion results for an iterable of frames
+
+    Frames may be any input accepted by load_image. With live=True the
+    source is read on a background thread through a LatestFrame, so frames
+    that arrive while the model is busy are dropped instead of queueing.
+    """
+    tracker = EmotionTracker(detect_every=detect_every, target_fps=target_fps)
+
+    if live:
+        buffer = LatestFrame()
+
+        def pump():
+            try:
+                for frame in frames:
+                    buffer.put(frame)
+            finally:
+                buffer.close()
+
+        threading.Thread(target=pump, name='emotion-stream-reader', daemon=True).start()
+        frames = buffer
+
+    for frame in frames:
+        timestamp = time.monotonic()
+        if not tracker.due(timestamp):
+            continue
+        try:
+            img = load_image(frame)
+        except Exception as e:
+            print(f"Skipping undecodable stream frame: {str(e)}")
+            continue
+        yield tracker.analyze(img, timestamp)
+
+
+async def track_emotions_async(frames, detect_every=5, target_fps=5.0):
+    """Async counterpart of track_emotions(live=True) for an async iterable of frames"""
+    tracker = EmotionTracker(detect_every=detect_every, target_fps=target_fps)
+    buffer = LatestFrame()
+
+    async def pump():
+        try:
+            async for frame in frames:
+                buffer.put(frame)
+        finally:
+            buffer.close()
+
+    reader = asyncio.create_task(pump())
+    try:
+        while True:
+            frame = await asyncio.to_thread(buffer.get, 0.5)
+            if frame is None:
+                if buffer.closed:
+                    break
+                continue
+            timestamp = time.monotonic()
+            if not tracker.due(timestamp):
+                continue
+            try:
+                img = await asyncio.to_thread(load_image, frame)
+            except Exception as e:
+                print(f"Skipping undecodable stream frame: {str(e)}")
+                continue
+            yield await asyncio.to_thread(tracker.analyze, img, timestamp)
+    finally:
+        reader.cancel()
@@ -0,0 +1,4 @@
+#!/bin/bash
+
+# Run the emotion API standalone (one warm model per worker process)
+exec python -m neurasync.serve "$@"
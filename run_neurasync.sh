@@ -4,7 +4,7 @@
 echo "Starting Neurasync application..."
 
 # Check if required Python packages are installed
-pip install streamlit flask flask-cors google-generativeai pillow requests &
+pip install streamlit flask flask-cors gunicorn google-generativeai pillow requests &
 
 # Start the main React application in the background
 echo "Starting main application..."
@@ -14,9 +14,14 @@ MAIN_PID=$!
 # Wait for the main application to start
 sleep 5
 
-# Start the Streamlit emotion detection module
+# Start the standalone emotion API on port 8502
+echo "Starting emotion API..."
+./run_emotion_api.sh &
+API_PID=$!
+
+# Start the Streamlit emotion detection module (API served separately above)
 echo "Starting emotion detection module..."
-./start_emotion_detection.sh &
+NEURASYNC_EMBED_API=0 ./start_emotion_detection.sh &
 STREAMLIT_PID=$!
 
 # Function to handle cleanup on exit
@@ -24,6 +29,7 @@ cleanup() {
     echo "Shutting down Neurasync..."
     kill $MAIN_PID 2>/dev/null
     kill $STREAMLIT_PID 2>/dev/null
+    kill $API_PID 2>/dev/null
     exit 0
 }
 
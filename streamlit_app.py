@@ -1,16 +1,20 @@
-import streamlit as st
-import google.generativeai as genai
+import time
+
+_script_start = time.perf_counter()
+
 import os
-import cv2
-import numpy as np
-from PIL import Image
-import base64
-import io
-import requests
-import json
-from datetime import datetime
-from streamlit.web.server.server import Server
 import threading
+import uuid
+
+import streamlit as st
+
+# Light imports only; the emotion engine, Gemini and the API server are loaded
+# lazily through the cached resources below
+from neurasync.labels import get_emotion_icon, get_emotion_recommendations
+from neurasync.messages import PAGE_SIZE, MessageStore
+from neurasync.smoothing import EmotionSmoother
+
+_imports_seconds = time.perf_counter() - _script_start
 
 # Page configuration
 st.set_page_config(
@@ -20,6 +24,56 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+
+# Process-wide resources: created by the first run, reused by every rerun and session
+@st.cache_resource(show_spinner=False)
+def startup_report():
+    """Startup timings of this process, in seconds"""
+    return {"imports": round(_imports_seconds, 3)}
+
+
+@st.cache_resource(show_spinner=False)
+def warm_up():
+    """Import and warm the emotion engine and Gemini client off the script thread"""
+    report = startup_report()
+
+    def _warm():
+        start = time.perf_counter()
+        import neurasync.gemini  # noqa: F401  (google.generativeai is slow to import)
+        report["geminiImport"] = round(time.perf_counter() - start, 3)
+        start = time.perf_counter()
+        from neurasync.emotion import start_engine
+        start_engine(background=False)
+        report["engineReady"] = round(time.perf_counter() - start, 3)
+
+    thread = threading.Thread(target=_warm, name="neurasync-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+@st.cache_resource(show_spinner=False)
+def get_gemini():
+    """The Gemini client module, configured from GEMINI_API_KEY once per process"""
+    from neurasync import gemini
+
+    gemini.configure_from_env()
+    return gemini
+
+
+@st.cache_resource(show_spinner=False)
+def start_api_server():
+    """Serve the emotion API once per process, so reruns never rebind port 8502"""
+    def _serve():
+        from neurasync.api import run_dev_server
+        run_dev_server()
+
+    thread = threading.Thread(target=_serve, name="emotion-api", daemon=True)
+    thread.start()
+    return thread
+
+
+warm_up()
+
 # Custom CSS for minimalist design
 st.markdown("""
 <style>
@@ -77,228 +131,38 @@ st.markdown("""
 
 # Initialize session state variables
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    # Bounded in memory; older turns spill to disk and load when paged back to
+    st.session_state.messages = MessageStore()
 
-if "current_emotion" not in st.session_state:
-    st.session_state.current_emotion = None
+if "visible_messages" not in st.session_state:
+    st.session_state.visible_messages = PAGE_SIZE
 
-if "api_key_configured" not in st.session_state:
-    # Check if API key exists in environment variables
-    api_key = os.environ.get("GEMINI_API_KEY")
-    st.session_state.api_key_configured = bool(api_key)
-    if api_key:
-        genai.configure(api_key=api_key)
-
-# System prompt for the therapeutic assistant
-THERAPEUTIC_PROMPT = """
-You are a supportive and empathetic therapeutic assistant called "Manassu" for Neurasync, a mental wellness platform.
+if "chat" not in st.session_state:
+    # Persistent Gemini chat for this session, created on first use
+    st.session_state.chat = None
 
-Please respond to all queries with a warm, compassionate tone that encourages growth and self-reflection.
-Use a conversational style that feels personal and caring.
-
-Your responses should:
-- Be supportive and non-judgmental
-- Offer gentle encouragement and motivation
-- Use empowering language that builds confidence
-- Ask thoughtful questions that promote self-reflection when appropriate
-- Acknowledge emotions and validate feelings
-- Provide practical coping strategies when relevant
-- Use a warm, conversational tone as if speaking to a friend
+if "current_emotion" not in st.session_state:
+    st.session_state.current_emotion = None
 
-Keep responses concise (under 150 words) but warm and helpful.
-Include 2-4 practical suggestions when appropriate.
-Never claim to be a licensed therapist or provide medical advice.
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
-Format your response with a main message and then 2-4 suggestions as bullet points if appropriate.
+if "stress_smoother" not in st.session_state:
+    # Smoothed stress over this session's recent readings
+    st.session_state.stress_smoother = EmotionSmoother(window=10)
+    st.session_state.last_frame_id = None
 
-Remember to maintain boundaries by not diagnosing conditions or replacing professional mental health care.
-"""
+if "api_key_configured" not in st.session_state:
+    # Check if API key exists in environment variables; Gemini is configured on first use
+    st.session_state.api_key_configured = bool(os.environ.get("GEMINI_API_KEY"))
 
 # Set up functions to interact with the Gemini API
 def configure_genai(api_key):
     """Configure the Gemini API with the provided key"""
-    genai.configure(api_key=api_key)
+    get_gemini().configure(api_key)
     st.session_state.api_key_configured = True
     return True
 
-def get_gemini_response(prompt, chat_history):
-    """Get response from Gemini model with therapeutic tone"""
-    try:
-        # Configure the model - use the latest 1.5 Pro version
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        # Start a chat session
-        chat = model.start_chat(history=chat_history)
-        
-        # Add therapeutic system prompt if this is the first message
-        if not chat_history:
-            # First combine the system prompt with the user's message
-            enhanced_prompt = f"{THERAPEUTIC_PROMPT}\n\nUser query: {prompt}"
-            response = chat.send_message(enhanced_prompt)
-        else:
-            # For subsequent messages, the tone should be established
-            response = chat.send_message(prompt)
-        
-        return response.text
-    except Exception as e:
-        return f"Error: {str(e)}"
-
-def format_chat_history(messages):
-    """Format chat history for Gemini API"""
-    formatted_history = []
-    
-    for message in messages:
-        role = "user" if message["role"] == "user" else "model"
-        formatted_history.append({
-            "role": role,
-            "parts": [message["content"]]
-        })
-    
-    return formatted_history
-
-def image_to_base64(image):
-    """Convert an image to base64 string"""
-    buffered = io.BytesIO()
-    image.save(buffered, format="JPEG")
-    return base64.b64encode(buffered.getvalue()).decode()
-
-def detect_emotion(img_base64):
-    """
-    Detect emotion using OpenCV and deepface
-    """
-    try:
-        from deepface import DeepFace
-        import cv2
-        import numpy as np
-        
-        # Convert base64 to image
-        img_data = base64.b64decode(img_base64.split(',')[1] if ',' in img_base64 else img_base64)
-        nparr = np.frombuffer(img_data, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            raise ValueError("Failed to decode image")
-            
-        # Analyze emotion using deepface
-        result = DeepFace.analyze(img, 
-                                actions=['emotion'],
-                                detector_backend='opencv',
-                                enforce_detection=False,
-                                silent=True)
-        
-        # Handle single result or list of results
-        emotions = result[0]['emotion'] if isinstance(result, list) else result['emotion']
-        
-        # Get dominant emotion
-        dominant_emotion = max(emotions.items(), key=lambda x: x[1])[0]
-        confidence = emotions[dominant_emotion]
-        
-        # Map emotion to stress level
-        stress_map = {
-            'happy': 15,
-            'neutral': 30,
-            'sad': 70,
-            'fear': 85,
-            'angry': 90,
-            'disgust': 75,
-            'surprise': 50
-        }
-        
-        stress_level = stress_map.get(dominant_emotion.lower(), 50)
-        
-        # Get secondary emotion
-        emotions_list = sorted(emotions.items(), key=lambda x: x[1], reverse=True)
-        secondary_emotion = emotions_list[1][0]
-        secondary_confidence = emotions_list[1][1]
-        
-        return {
-            "stressLevel": stress_level,
-            "primaryEmotion": {
-                "name": dominant_emotion,
-                "confidence": round(confidence)
-            },
-            "secondaryEmotion": {
-                "name": secondary_emotion,
-                "confidence": round(secondary_confidence)
-            },
-            "insight": f"Your primary emotion appears to be {dominant_emotion.lower()} with {round(confidence)}% confidence. This suggests a {stress_level}% stress level."
-        }
-            
-    except Exception as e:
-        print(f"Error in emotion detection: {str(e)}")
-        return {
-            "stressLevel": 30,
-            "primaryEmotion": {"name": "neutral", "confidence": 50},
-            "secondaryEmotion": {"name": "calm", "confidence": 30},
-            "insight": "Unable to detect emotion clearly. Using neutral as default."
-        }
-
-def analyze_emotion_with_gemini(img_base64):
-    """Analyze emotion using Gemini directly if backend is unavailable"""
-    try:
-        if not st.session_state.api_key_configured:
-            return {
-                "primaryEmotion": {"name": "unknown", "confidence": 0},
-                "secondaryEmotion": {"name": "unknown", "confidence": 0},
-                "stressLevel": 50,
-                "insight": "Please configure the Gemini API key to enable emotion detection."
-            }
-            
-        model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        prompt = """
-        Analyze this facial image and detect the emotional state. 
-        
-        Return your answer as a valid JSON object with the following structure:
-        {
-          "primaryEmotion": {"name": "<emotion>", "confidence": <0.0-1.0>},
-          "secondaryEmotion": {"name": "<emotion>", "confidence": <0.0-1.0>},
-          "stressLevel": <0-100>,
-          "insight": "<brief insight about the emotional state>"
-        }
-        
-        For emotions, use one of: happy, sad, angry, surprised, fearful, disgusted, contempt, neutral.
-        """
-        
-        response = model.generate_content(
-            [
-                prompt,
-                genai.types.Part(
-                    inline_data=genai.types.Blob(
-                        mime_type="image/jpeg",
-                        data=base64.b64decode(img_base64)
-                    )
-                )
-            ]
-        )
-        
-        # Extract JSON from the response
-        response_text = response.text
-        # Find the JSON part (assuming it might be embedded in markdown)
-        try:
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-            json_str = response_text[json_start:json_end]
-            result = json.loads(json_str)
-            return result
-        except (json.JSONDecodeError, ValueError):
-            # If JSON parsing fails, return a default response
-            return {
-                "primaryEmotion": {"name": "neutral", "confidence": 0.5},
-                "secondaryEmotion": {"name": "unknown", "confidence": 0.1},
-                "stressLevel": 30,
-                "insight": "Unable to properly analyze the image."
-            }
-            
-    except Exception as e:
-        st.error(f"Error analyzing emotion with Gemini: {str(e)}")
-        return {
-            "primaryEmotion": {"name": "error", "confidence": 0},
-            "secondaryEmotion": {"name": "error", "confidence": 0},
-            "stressLevel": 50,
-            "insight": f"Error during analysis: {str(e)}"
-        }
-
 def get_stress_level_color(stress_level):
     """Return a color based on stress level (0-100)"""
     if stress_level < 30:
@@ -308,82 +172,6 @@ def get_stress_level_color(stress_level):
     else:
         return "red"
 
-def get_emotion_icon(emotion):
-    """Return an emoji icon based on the detected emotion"""
-    emotion_icons = {
-        "happy": "😊",
-        "sad": "😢",
-        "angry": "😠",
-        "surprised": "😮",
-        "fearful": "😨",
-        "disgusted": "🤢",
-        "contempt": "😒",
-        "neutral": "😐",
-        "unknown": "❓",
-        "error": "⚠️"
-    }
-    return emotion_icons.get(emotion.lower(), "❓")
-
-def get_emotion_recommendations(emotion):
-    """Return recommendations based on the detected emotion"""
-    recommendations = {
-        "happy": [
-            "Savor this positive moment and reflect on what contributed to your happiness",
-            "Share your joy with someone else to amplify the positive emotions",
-            "Journal about this experience to revisit when you need a boost",
-            "Use this energy for a creative activity or task you've been putting off"
-        ],
-        "sad": [
-            "Practice self-compassion and acknowledge your feelings without judgment",
-            "Reach out to a trusted friend or family member for support",
-            "Engage in a gentle activity that typically brings you comfort",
-            "Try a brief mindfulness meditation focused on acceptance"
-        ],
-        "angry": [
-            "Take a few deep breaths to activate your parasympathetic nervous system",
-            "Find a physical outlet like a brief walk or stretching",
-            "Write down what's triggering your anger without censoring yourself",
-            "Consider if there's a boundary you need to establish or communicate"
-        ],
-        "surprised": [
-            "Give yourself time to process the unexpected information or event",
-            "Write down your initial reactions and questions",
-            "Seek additional information if needed before making decisions",
-            "Consider how this surprise might offer new opportunities"
-        ],
-        "fearful": [
-            "Practice grounding techniques like the 5-4-3-2-1 sensory exercise",
-            "Distinguish between real threats and anxiety-based thoughts",
-            "Break down overwhelming concerns into smaller, manageable parts",
-            "Reach out for support from trusted people in your life"
-        ],
-        "disgusted": [
-            "Remove yourself from the triggering situation if possible",
-            "Practice cleansing breathing exercises or visualization",
-            "Consider if this reaction connects to a deeper value or boundary",
-            "Engage in an activity that helps you feel restored"
-        ],
-        "contempt": [
-            "Practice empathy by considering alternative perspectives",
-            "Reflect on whether this reaction stems from unmet expectations",
-            "Consider if there are boundaries you need to establish",
-            "Try a brief mindfulness practice to create space between thoughts and reactions"
-        ],
-        "neutral": [
-            "Check in with yourself about any subtle emotions beneath the neutral surface",
-            "Consider what activities might engage or energize you right now",
-            "Use this balanced state for reflection or planning",
-            "Practice gratitude for moments of calm and equilibrium"
-        ]
-    }
-    
-    return recommendations.get(emotion.lower(), [
-        "Take a moment to reflect on how you're feeling",
-        "Practice a brief mindfulness exercise to connect with your emotions",
-        "Consider journaling about your current emotional state",
-        "Reach out to someone you trust if you need support"
-    ])
-
 # Custom CSS for styling the app
 st.markdown("""
 <style>
@@ -532,8 +320,15 @@ with st.sidebar:
     *This tool is designed to complement, not replace, professional mental health care.*
     """)
     
+    with st.expander("Performance"):
+        st.json(startup_report())
+        if "last_run_ms" in st.session_state:
+            st.caption(f"Previous run rendered in {st.session_state.last_run_ms} ms")
+
     if st.button("Clear Chat History"):
-        st.session_state.messages = []
+        st.session_state.messages.clear()
+        st.session_state.visible_messages = PAGE_SIZE
+        st.session_state.chat = None
         st.rerun()
 
 # Main content area with two columns
@@ -546,17 +341,26 @@ with col1:
     img_file_buffer = st.camera_input("Take a photo to analyze your emotional state")
     
     if img_file_buffer is not None:
-        # Convert the file buffer to a PIL Image
-        image = Image.open(img_file_buffer)
-        
-        # Convert to base64 for API call
-        img_base64 = image_to_base64(image)
+        # Pass the captured JPEG bytes straight to the detector (no re-encode)
+        img_bytes = img_file_buffer.getvalue()
         
         # Detect emotion from the image
         with st.spinner("Analyzing your emotional state..."):
-            emotion_analysis = detect_emotion(img_base64)
+            from neurasync.hybrid import analyze_hybrid
+
+            if st.session_state.api_key_configured:
+                get_gemini()
+            # Local model first; Gemini steps in when it fails or is unsure
+            emotion_analysis = analyze_hybrid(img_bytes)
             st.session_state.current_emotion = emotion_analysis
         
+        # Fold each new capture into the smoothed estimate once, not on every rerun
+        frame_id = getattr(img_file_buffer, "file_id", None) or hash(img_bytes)
+        if frame_id != st.session_state.last_frame_id and "emotions" in emotion_analysis:
+            st.session_state.stress_smoother.update(emotion_analysis["emotions"])
+            st.session_state.last_frame_id = frame_id
+        smoothed = st.session_state.stress_smoother.result()
+        
         # Display the emotion analysis
         if emotion_analysis:
             primary_emotion = emotion_analysis.get("primaryEmotion", {}).get("name", "unknown")
@@ -576,6 +380,8 @@ with col1:
             stress_color = get_stress_level_color(stress_level)
             st.markdown(f'<div class="emotion-header">Stress Level: {stress_level}%</div>', unsafe_allow_html=True)
             st.progress(stress_level/100)
+            if smoothed and smoothed["samples"] > 1:
+                st.caption(f'Smoothed over your last {smoothed["samples"]} readings: {smoothed["stressLevel"]}% stress, mostly {smoothed["primaryEmotion"]["name"]}')
             
             # Display insight
             st.markdown("#### Insight")
@@ -594,11 +400,14 @@ with col1:
             
             # Option to save the analysis
             if st.button("Save This Analysis"):
-                # Here you would integrate with your backend to save the analysis
-                st.success("Analysis saved successfully!")
-                
-                # You could also add functionality to send this to the main Neurasync application
-                # requests.post("http://localhost:5000/api/analysis/save", json=emotion_analysis)
+                from neurasync.store import get_store
+
+                # Queued for the background writer (and the Node backend if forwarding is on)
+                if get_store().append(emotion_analysis, session=st.session_state.session_id,
+                                      source="streamlit", forward=True):
+                    st.success("Analysis saved successfully!")
+                else:
+                    st.error("Too many analyses are waiting to be saved. Please try again.")
     else:
         st.info("Take a photo to analyze your emotional state. Make sure your face is clearly visible and well-lit.")
 
@@ -612,17 +421,18 @@ with col2:
         # Initial message if chat is empty
         if not st.session_state.messages:
             initial_message = "Hi there! I'm Manassu, your supportive AI companion. I'm here to listen and provide encouragement. What's on your mind today?"
-            st.session_state.messages.append({
-                "role": "assistant", 
-                "content": initial_message,
-                "timestamp": datetime.now().strftime("%H:%M")
-            })
+            st.session_state.messages.append("assistant", initial_message)
         
-        # Display chat messages
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-                st.markdown(f'<div class="timestamp">{message.get("timestamp", "")}</div>', unsafe_allow_html=True)
+        # Display only the latest window of messages; earlier ones load a page at a time
+        messages = st.session_state.messages
+        first = max(0, len(messages) - st.session_state.visible_messages)
+        if first and st.button(f"Load earlier messages ({first} more)"):
+            st.session_state.visible_messages += PAGE_SIZE
+            st.rerun()
+        for message in messages.window(first):
+            with st.chat_message(message.role):
+                st.markdown(message.content)
+                st.markdown(f'<div class="timestamp">{message.time_label()}</div>', unsafe_allow_html=True)
         
         st.markdown('</div>', unsafe_allow_html=True)
         
@@ -630,14 +440,18 @@ with col2:
         user_input = st.chat_input("Share your thoughts here...")
         
         if user_input:
+            # Start this session's chat once, seeded with the conversation so far
+            if st.session_state.chat is None:
+                gemini = get_gemini()
+                st.session_state.chat = gemini.ManassuChat(
+                    gemini.format_chat_history(message.to_dict() for message in st.session_state.messages))
+            
             # Add user message to chat history with timestamp
-            st.session_state.messages.append({
-                "role": "user", 
-                "content": user_input,
-                "timestamp": datetime.now().strftime("%H:%M")
-            })
+            st.session_state.messages.append("user", user_input)
             
-            # Display user message (already handled by the loop above)
+            # Display the user message now; the history loop above ran before it was added
+            with st.chat_message("user"):
+                st.markdown(user_input)
             
             # If we have detected an emotion, include it in the context for the AI
             emotion_context = ""
@@ -646,58 +460,33 @@ with col2:
                 if primary_emotion and primary_emotion not in ["unknown", "error"]:
                     emotion_context = f"\n\nNote: The user's current detected emotion is {primary_emotion}."
             
-            # Get response from Gemini with emotion context if available
-            with st.spinner("Thinking..."):
-                formatted_history = format_chat_history(
-                    [m for m in st.session_state.messages if m != st.session_state.messages[-1]]
-                )
-                
-                response = get_gemini_response(user_input + emotion_context, formatted_history)
+            # Stream the response from Gemini into the chat bubble as tokens arrive
+            with st.chat_message("assistant"):
+                response = st.write_stream(st.session_state.chat.stream(user_input + emotion_context))
                 
             # Add assistant response to chat history with timestamp
-            st.session_state.messages.append({
-                "role": "assistant", 
-                "content": response,
-                "timestamp": datetime.now().strftime("%H:%M")
-            })
+            st.session_state.messages.append("assistant", response)
             
             # Force a rerun to display the new messages
             st.rerun()
     else:
         st.info("Please configure your Gemini API key to start chatting with Manassu.")
 
-# Setup API endpoint for integration with React frontend
-from flask import Flask, request, jsonify
-from flask_cors import CORS
-import threading
-
-# Create a Flask app for API endpoints
-api_app = Flask(__name__)
-CORS(api_app)  # Allow cross-origin requests
-
-@api_app.route('/api/detect_emotion', methods=['POST'])
-def api_detect_emotion():
-    """API endpoint for emotion detection accessible to the React frontend"""
-    try:
-        data = request.json
-        if not data or 'image' not in data:
-            return jsonify({'error': 'No image data provided'}), 400
-        
-        # Process the image using the existing detect_emotion function
-        result = detect_emotion(data['image'])
-        return jsonify(result)
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-# Start Flask API server in a separate thread
-def run_api_server():
-    api_app.run(host='0.0.0.0', port=8502)
-
-# Start the API server in a background thread when the app runs
-api_thread = threading.Thread(target=run_api_server, daemon=True)
-api_thread.start()
+# Serve the emotion API for the React frontend from this process during local
+# development; in production run `python -m neurasync.serve` and set
+# NEURASYNC_EMBED_API=0
+if os.environ.get("NEURASYNC_EMBED_API", "1") == "1":
+    start_api_server()
 
 # Footer
 st.markdown("---")
 st.caption("💭 Remember that while AI can provide support, it's not a substitute for professional mental health services.")
-st.caption("© 2025 Neurasync - AI-powered wellness platform")
\ No newline at end of file
+st.caption("© 2025 Neurasync - AI-powered wellness platform")
+
+# Startup and rerun timings
+run_seconds = time.perf_counter() - _script_start
+report = startup_report()
+if "firstRun" not in report:
+    report["firstRun"] = round(run_seconds, 3)
+    print(f"Neurasync startup (seconds): {report}")
+st.session_state.last_run_ms = round(run_seconds * 1000)
\ No newline at end of file